@@ -0,0 +1,241 @@
+import os
+import sys
+import json
+import time
+import shutil
+import tarfile
+import argparse
+import tempfile
+import subprocess
+
+from loggen import LogGenerator
+
+# Каталог со скриптами парсеров (рядом с этим файлом)
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(SCRIPTS_DIR, 'benchmark_baseline.json')
+
+# Варианты парсеров: имя в отчете -> скрипт и аргументы после пути к логу
+PARSERS = {
+    'minparser': ('minparser.py', []),
+    'minparser2': ('minparser2.py', []),
+    'hourparser': ('hourparser.py', []),
+    'hourparser2': ('hourparser2.py', []),
+    'dayparser': ('dayparser.py', []),
+    'dayparser2': ('dayparser2.py', []),
+    'multiparser': ('multiparser.py', []),
+    'multiparser-statements-only': ('multiparser.py', ['--statements-only']),
+}
+
+# Допустимое ухудшение относительно базовой линии (доля)
+DEFAULT_TOLERANCE = 0.15
+
+
+def run_measured(args, cwd):
+    """Запуск процесса с замером времени и пиковой памяти; (секунды, пиковый RSS в КБ)"""
+    started = time.perf_counter()
+    process = subprocess.Popen(args, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    # wait4 возвращает ресурсы именно этого процесса, а не всех дочерних
+    _, status, usage = os.wait4(process.pid, 0)
+    seconds = time.perf_counter() - started
+    stderr = process.stderr.read().decode('utf-8', errors='replace')
+    process.stderr.close()
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)} завершился с кодом {process.returncode}: {stderr.strip()}")
+    # На Linux ru_maxrss в КБ, на macOS - в байтах
+    peak_rss = usage.ru_maxrss // 1024 if sys.platform == 'darwin' else usage.ru_maxrss
+    return seconds, peak_rss
+
+
+def directory_size(path):
+    """Суммарный размер файлов каталога"""
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+def count_lines(path):
+    """Число строк файла"""
+    with open(path, 'rb') as f:
+        return sum(block.count(b'\n') for block in iter(lambda: f.read(1024 * 1024), b''))
+
+
+def extract_member(archive_dir, prefix, target):
+    """Извлечение из архива в archive_dir файла, имя которого начинается с prefix"""
+    for name in os.listdir(archive_dir):
+        if not name.endswith('.tar.gz'):
+            continue
+        with tarfile.open(os.path.join(archive_dir, name)) as tar:
+            for member in tar.getmembers():
+                if os.path.basename(member.name).startswith(prefix):
+                    with tar.extractfile(member) as src, open(target, 'wb') as dst:
+                        shutil.copyfileobj(src, dst)
+                    return target
+    raise RuntimeError(f"В архиве {archive_dir} нет файла {prefix}*")
+
+
+class Benchmark:
+    """Замер пропускной способности, пиковой памяти и объема результатов.
+
+    Каждый вариант запускается отдельным процессом в чистом каталоге на
+    одном и том же сгенерированном логе; из repeat запусков берется лучшее
+    время и наибольшая память. summary_comparer сравнивает минутные сводки
+    двух логов, group_combined группирует результат сравнения.
+    """
+
+    def __init__(self, work_dir, size, repeat=1, parsers=None):
+        self.work_dir = work_dir
+        self.size = size
+        self.repeat = repeat
+        self.parsers = parsers or list(PARSERS)
+        self.results = {}
+
+    def generate_logs(self):
+        """Два лога одного дня с разными seed (для сравнения сводок)"""
+        self.logs = []
+        for seed in (1, 2):
+            path = os.path.join(self.work_dir, f"bench{seed}.log")
+            LogGenerator(seed=seed).write(path, self.size)
+            self.logs.append(path)
+        self.log_lines = count_lines(self.logs[0])
+        print(f"Лог для замеров: {os.path.getsize(self.logs[0]) / 1048576:.1f} МБ, {self.log_lines} строк")
+
+    def measure(self, name, args, lines, output=None, prepare=None):
+        """Замер одного варианта; output - файл результата (по умолчанию весь каталог запуска)"""
+        best = None
+        peak = 0
+        for attempt in range(self.repeat):
+            run_dir = os.path.join(self.work_dir, f"{name}-{attempt}")
+            os.mkdir(run_dir)
+            if prepare:
+                prepare(run_dir)
+            seconds, peak_rss = run_measured([sys.executable] + args, run_dir)
+            output_bytes = os.path.getsize(os.path.join(run_dir, output)) if output else directory_size(run_dir)
+            best = seconds if best is None else min(best, seconds)
+            peak = max(peak, peak_rss)
+            if attempt < self.repeat - 1:
+                shutil.rmtree(run_dir)
+        self.results[name] = {
+            'seconds': best,
+            'lines': lines,
+            'lines_per_sec': lines / best if best else None,
+            'peak_rss_kb': peak,
+            'output_bytes': output_bytes,
+        }
+        return run_dir
+
+    def run(self):
+        self.generate_logs()
+        for name in self.parsers:
+            script, extra = PARSERS[name]
+            self.measure(name, [os.path.join(SCRIPTS_DIR, script), self.logs[0]] + extra, self.log_lines)
+        self.run_comparison()
+        return self.results
+
+    def run_comparison(self):
+        """Замер summary_comparer и group_combined на минутных сводках двух логов"""
+        summaries = []
+        for index, log in enumerate(self.logs):
+            run_dir = os.path.join(self.work_dir, f"summaries{index}")
+            os.mkdir(run_dir)
+            run_measured([sys.executable, os.path.join(SCRIPTS_DIR, 'minparser.py'), log, '--no-dumps'], run_dir)
+            summaries.append(extract_member(run_dir, 'summary_minute_', os.path.join(self.work_dir, f"summary{index}.log")))
+        summary_lines = sum(count_lines(path) for path in summaries)
+
+        comparer_dir = self.measure(
+            'summary_comparer',
+            [os.path.join(SCRIPTS_DIR, 'summary_comparer.py')] + summaries,
+            summary_lines, output='combined_results.log',
+        )
+        combined = os.path.join(comparer_dir, 'combined_results.log')
+        self.measure(
+            'group_combined',
+            [os.path.join(SCRIPTS_DIR, 'group_combined.py')],
+            count_lines(combined), output='grouped_combined_results.log',
+            prepare=lambda run_dir: shutil.copy(combined, run_dir),
+        )
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    """Сравнение с базовой линией: список строк с ухудшениями сверх tolerance"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if result['lines_per_sec'] < base['lines_per_sec'] * (1 - tolerance):
+            regressions.append(
+                f"{name}: {result['lines_per_sec']:.0f} строк/с против {base['lines_per_sec']:.0f} в базовой линии"
+            )
+        if result['peak_rss_kb'] > base['peak_rss_kb'] * (1 + tolerance):
+            regressions.append(
+                f"{name}: пиковая память {result['peak_rss_kb']} КБ против {base['peak_rss_kb']} КБ"
+            )
+        if result['output_bytes'] > base['output_bytes'] * (1 + tolerance):
+            regressions.append(
+                f"{name}: результат {result['output_bytes']} байт против {base['output_bytes']} байт"
+            )
+    return regressions
+
+
+def print_results(results, baseline):
+    print(f"{'вариант':<30} {'строк/с':>10} {'с':>8} {'RSS, МБ':>8} {'результат, КБ':>14} {'к базе':>8}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        ratio = f"{result['lines_per_sec'] / base['lines_per_sec']:.2f}x" if base else '-'
+        print(
+            f"{name:<30} {result['lines_per_sec']:>10.0f} {result['seconds']:>8.2f} "
+            f"{result['peak_rss_kb'] / 1024:>8.1f} {result['output_bytes'] / 1024:>14.1f} {ratio:>8}"
+        )
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Замеры парсеров, summary_comparer и group_combined")
+    arg_parser.add_argument('--size-mb', type=float, default=20, help="размер сгенерированного лога, МБ")
+    arg_parser.add_argument('--repeat', type=int, default=1, help="число запусков каждого варианта (берется лучшее время)")
+    arg_parser.add_argument(
+        '--parsers', nargs='+', choices=list(PARSERS), metavar='ПАРСЕР',
+        help=f"замерять только эти парсеры: {', '.join(PARSERS)}"
+    )
+    arg_parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="файл базовой линии")
+    arg_parser.add_argument('--save-baseline', action='store_true', help="сохранить результаты как базовую линию")
+    arg_parser.add_argument(
+        '--tolerance', type=float, default=DEFAULT_TOLERANCE,
+        help="допустимое ухудшение относительно базовой линии (доля)"
+    )
+    arg_parser.add_argument('--output', help="JSON-файл с результатами замеров")
+    args = arg_parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            stored = json.load(f)
+        # Замеры на логе другого размера несравнимы
+        if stored['size_mb'] == args.size_mb:
+            baseline = stored['results']
+        else:
+            print(f"Базовая линия снята на логе {stored['size_mb']} МБ, сравнение пропущено")
+
+    work_dir = tempfile.mkdtemp(prefix='benchmark-')
+    try:
+        results = Benchmark(work_dir, int(args.size_mb * 1024 * 1024), args.repeat, args.parsers).run()
+    finally:
+        shutil.rmtree(work_dir)
+
+    print_results(results, baseline)
+    report = {'size_mb': args.size_mb, 'results': results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Базовая линия сохранена в {args.baseline}")
+        return 0
+
+    regressions = compare_with_baseline(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"Ухудшение: {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
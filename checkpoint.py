@@ -0,0 +1,105 @@
+import os
+import json
+import hashlib
+
+CHECKPOINT_VERSION = 6
+# Объем начала файла, по которому узнается тот же лог
+HEAD_BYTES = 4096
+
+
+def head_hash(path, length):
+    """SHA-256 первых length байт файла"""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read(length)).hexdigest()
+
+
+def log_identity(path):
+    """Идентичность файла лога: inode, размер и хеш начала"""
+    stat = os.stat(path)
+    head_length = min(HEAD_BYTES, stat.st_size)
+    return {
+        'path': os.path.abspath(path),
+        'inode': stat.st_ino,
+        'size': stat.st_size,
+        'head_length': head_length,
+        'head_sha256': head_hash(path, head_length),
+    }
+
+
+def same_log(saved, path, offset):
+    """Тот ли это лог, что в контрольной точке, и не стал ли он короче прочитанного.
+
+    Inode не сравнивается: скопированный или восстановленный файл с тем же
+    содержимым продолжает разбираться с сохраненного смещения.
+    """
+    stat = os.stat(path)
+    if stat.st_size < offset or stat.st_size < saved['head_length']:
+        return False
+    return head_hash(path, saved['head_length']) == saved['head_sha256']
+
+
+def encode_state(state):
+    """Состояние из export_state() в JSON-совместимом виде (ключи-отпечатки - целые числа)"""
+    encoded = dict(state)
+    # В режиме top-K вместо счетчиков уже JSON-совместимые состояния SpaceSaving
+    if not state.get('top_k'):
+        encoded['stats'] = {
+            granularity: {bucket: list(counts.items()) for bucket, counts in buckets.items()}
+            for granularity, buckets in state['stats'].items()
+        }
+    encoded['detail_counts'] = {date: list(counts.items()) for date, counts in state['detail_counts'].items()}
+    encoded['fingerprints'] = list(state['fingerprints'].items())
+    if state.get('latency') is not None:
+        encoded['latency'] = {
+            granularity: {bucket: list(sketches.items()) for bucket, sketches in buckets.items()}
+            for granularity, buckets in state['latency'].items()
+        }
+    if state.get('detail_cardinality') is not None:
+        encoded['detail_cardinality'] = {
+            date: list(sketches.items()) for date, sketches in state['detail_cardinality'].items()
+        }
+    return encoded
+
+
+def decode_state(encoded):
+    """Обратное преобразование encode_state()"""
+    state = dict(encoded)
+    if not encoded.get('top_k'):
+        state['stats'] = {
+            granularity: {bucket: dict(counts) for bucket, counts in buckets.items()}
+            for granularity, buckets in encoded['stats'].items()
+        }
+    state['detail_counts'] = {date: dict(counts) for date, counts in encoded['detail_counts'].items()}
+    state['fingerprints'] = dict(encoded['fingerprints'])
+    if encoded.get('latency') is not None:
+        state['latency'] = {
+            granularity: {bucket: dict(sketches) for bucket, sketches in buckets.items()}
+            for granularity, buckets in encoded['latency'].items()
+        }
+    if encoded.get('detail_cardinality') is not None:
+        state['detail_cardinality'] = {
+            date: dict(sketches) for date, sketches in encoded['detail_cardinality'].items()
+        }
+    return state
+
+
+def save_checkpoint(path, checkpoint):
+    """Атомарная запись контрольной точки (через временный файл и rename)"""
+    checkpoint = dict(checkpoint, version=CHECKPOINT_VERSION)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def load_checkpoint(path):
+    """Контрольная точка или None, если файла нет"""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('version') != CHECKPOINT_VERSION:
+        raise ValueError(f"Неподдерживаемая версия контрольной точки {path}")
+    return checkpoint
@@ -0,0 +1,166 @@
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    # numpy нужен только для колоночного подсчета (--columnar)
+    np = None
+
+# Записей в порции, после которой столбцы сворачиваются в счетчики
+CHUNK_ROWS = 1 << 20
+# Длина 'ГГГГ-ММ-ДД ЧЧ:ММ:СС' - начала любой временной метки лога
+TIMESTAMP_WIDTH = 19
+GRANULARITIES = ('minute', 'hour', 'day')
+# Дней в месяцах невисокосного года
+MONTH_DAYS = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+
+def columnar_available():
+    return np is not None
+
+
+def group_counts(keys, fingerprints, weights=None):
+    """Группировка по (ключ, отпечаток): уникальные пары по возрастанию и суммы весов"""
+    if not len(keys):
+        return keys, fingerprints, np.zeros(0, dtype=np.int64)
+    order = np.lexsort((fingerprints, keys))
+    keys = keys[order]
+    fingerprints = fingerprints[order]
+    starts = np.flatnonzero(
+        np.concatenate(([True], (keys[1:] != keys[:-1]) | (fingerprints[1:] != fingerprints[:-1])))
+    )
+    if weights is None:
+        counts = np.diff(np.append(starts, len(keys)))
+    else:
+        counts = np.add.reduceat(weights[order], starts)
+    return keys[starts], fingerprints[starts], counts
+
+
+def format_key(granularity, key):
+    """Ключ времени сводки из упакованного целого ГГГГММДД[ЧЧ[ММ]]"""
+    if granularity == 'day':
+        digits = f"{key:08d}"
+        return f"{digits[:4]}-{digits[4:6]}-{digits[6:8]}"
+    if granularity == 'hour':
+        digits = f"{key:010d}"
+        return f"{digits[:4]}-{digits[4:6]}-{digits[6:8]} {digits[8:10]}:00"
+    digits = f"{key:012d}"
+    return f"{digits[:4]}-{digits[4:6]}-{digits[6:8]} {digits[8:10]}:{digits[10:12]}"
+
+
+class ColumnarCounts:
+    """Счетчики сводок в столбцах numpy вместо словарей словарей.
+
+    add() только дописывает начало метки и отпечаток в плоские буферы.
+    Порция из chunk_rows записей разбирается векторно: цифры метки
+    упаковываются в целые ключи ГГГГММДД, ГГГГММДДЧЧ и ГГГГММДДЧЧММ,
+    некорректные даты и время отсекаются маской, а пары (ключ, отпечаток)
+    считаются сортировкой. Счетчики порций хранятся массивами по 24 байта
+    на различную пару и сливаются, как в LSM-дереве, когда предыдущая
+    часть не больше чем вдвое крупнее новой: каждая пара пересортируется
+    O(log n) раз.
+
+    Ключи совпадают с MultiLogParser.bucket_keys: для корректной метки
+    strftime дает те же ГГГГ-ММ-ДД ЧЧ:ММ, что и в исходной строке, а
+    дневной ключ - первые 10 символов. Метки с не-ASCII цифрами и годами
+    до 1000 (strftime пишет их без ведущих нулей) передаются в fallback -
+    обычный подсчет в словарях.
+    """
+
+    def __init__(self, fallback, chunk_rows=CHUNK_ROWS):
+        if np is None:
+            raise ImportError("Для колоночного подсчета нужен numpy (pip install numpy)")
+        self.fallback = fallback
+        self.chunk_rows = chunk_rows
+        self.timestamps = bytearray()
+        self.fingerprints = array('Q')
+        # Гранулярность -> части счетчиков (ключи, отпечатки, количества) по убыванию размера
+        self.parts = {granularity: [] for granularity in GRANULARITIES}
+
+    def add(self, timestamp, fingerprint):
+        """Учет отпечатка запроса (замена MultiLogParser.count_statement)"""
+        if not timestamp.isascii():
+            self.fallback(timestamp, fingerprint)
+            return
+        self.timestamps += timestamp[:TIMESTAMP_WIDTH].encode('ascii')
+        self.fingerprints.append(fingerprint)
+        if len(self.fingerprints) >= self.chunk_rows:
+            self.aggregate()
+
+    def aggregate(self):
+        """Свертка накопленной порции в счетчики"""
+        if not self.fingerprints:
+            return
+        raw = np.frombuffer(bytes(self.timestamps), dtype=np.uint8).reshape(-1, TIMESTAMP_WIDTH)
+        fingerprints = np.frombuffer(self.fingerprints.tobytes(), dtype=np.uint64)
+        self.timestamps = bytearray()
+        self.fingerprints = array('Q')
+
+        def number(*positions):
+            # Столбцы цифр переводятся в int64 по одному, без копии всей порции
+            value = np.zeros(len(raw), dtype=np.int64)
+            for position in positions:
+                value = value * 10 + (raw[:, position].astype(np.int64) - ord('0'))
+            return value
+
+        year = number(0, 1, 2, 3)
+        month = number(5, 6)
+        day = number(8, 9)
+        hour = number(11, 12)
+        minute = number(14, 15)
+        second = number(17, 18)
+
+        leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+        month_days = np.asarray(MONTH_DAYS)[np.clip(month, 1, 12) - 1] + (leap & (month == 2))
+        valid = (
+            (year >= 1) & (month >= 1) & (month <= 12) & (day >= 1) & (day <= month_days)
+            & (hour <= 23) & (minute <= 59) & (second <= 59)
+        )
+        # Корректные метки с годом до 1000 считаются по-старому
+        odd = valid & (year < 1000)
+        for index in np.flatnonzero(odd).tolist():
+            self.fallback(raw[index].tobytes().decode('ascii'), int(fingerprints[index]))
+        regular = ~odd
+        valid &= regular
+
+        day_key = (year * 100 + month) * 100 + day
+        hour_key = day_key * 100 + hour
+        minute_key = hour_key * 100 + minute
+        self.merge_counts('day', day_key[regular], fingerprints[regular])
+        self.merge_counts('hour', hour_key[valid], fingerprints[valid])
+        self.merge_counts('minute', minute_key[valid], fingerprints[valid])
+
+    def merge_counts(self, granularity, keys, fingerprints):
+        """Добавление пар порции к счетчикам гранулярности"""
+        parts = self.parts[granularity]
+        parts.append(group_counts(keys, fingerprints))
+        while len(parts) > 1 and len(parts[-2][0]) <= 2 * len(parts[-1][0]):
+            newer = parts.pop()
+            older = parts.pop()
+            parts.append(group_counts(*(np.concatenate(columns) for columns in zip(older, newer))))
+
+    def totals(self, granularity):
+        """Все части гранулярности, слитые в одну"""
+        parts = self.parts[granularity]
+        if len(parts) > 1:
+            parts[:] = [group_counts(*(np.concatenate(columns) for columns in zip(*parts)))]
+        return parts[0] if parts else None
+
+    def drain_into(self, stats):
+        """Перенос счетчиков в словари stats (гранулярность -> ключ -> отпечаток -> количество)"""
+        self.aggregate()
+        for granularity in GRANULARITIES:
+            totals = self.totals(granularity)
+            self.parts[granularity] = []
+            if totals is None or not len(totals[0]):
+                continue
+            keys, fingerprints, counts = totals
+            buckets = stats[granularity]
+            starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1]))).tolist()
+            ends = starts[1:] + [len(keys)]
+            fingerprints = fingerprints.tolist()
+            counts = counts.tolist()
+            for start, end, key in zip(starts, ends, keys[starts].tolist()):
+                bucket = buckets[format_key(granularity, key)]
+                for fingerprint, count in zip(fingerprints[start:end], counts[start:end]):
+                    bucket[fingerprint] += count
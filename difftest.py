@@ -0,0 +1,364 @@
+import io
+import os
+import re
+import sys
+import gzip
+import random
+import shutil
+import difflib
+import tarfile
+import argparse
+import tempfile
+import subprocess
+import importlib.util
+
+from loggen import LogGenerator
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Сравниваемые результаты: вид -> имя члена архива начинается с '<вид>_'
+RESULT_KINDS = ('summary_minute', 'summary_hour', 'summary_day', 'detail_summary')
+RESULT_PATTERN = re.compile(r'^(summary_minute|summary_hour|summary_day|detail_summary)_')
+
+# Эталонные парсеры: v1 учитывают prepare, v2 - только statement/execute
+REFERENCE_SCRIPTS = {
+    False: ('minparser.py', 'hourparser.py', 'dayparser.py'),
+    True: ('minparser2.py', 'hourparser2.py', 'dayparser2.py'),
+}
+
+# Режимы проверяемого движка: имя -> (аргументы, подача лога, только statement/execute).
+# Подача: file - путь к файлу, gzip - путь к сжатой копии, stdin - через стандартный ввод,
+# batch - каталог с логом, разрезанным на две части по границе записи (--batch)
+ENGINE_MODES = {
+    'engine': ([], 'file', False),
+    'engine-no-mmap': (['--no-mmap'], 'file', False),
+    'engine-workers': (['--workers', '3'], 'file', False),
+    'engine-checkpoint': (['--checkpoint', 'run.checkpoint', '--checkpoint-every', '1'], 'file', False),
+    'engine-gzip': ([], 'gzip', False),
+    'engine-stdin': ([], 'stdin', False),
+    'engine-statements-only': (['--statements-only'], 'file', True),
+    'engine-statements-only-workers': (['--statements-only', '--workers', '3'], 'file', True),
+    'engine-statements-only-no-mmap': (['--statements-only', '--no-mmap'], 'file', True),
+    # Разбор по log_line_prefix учитывает только statement/execute
+    'engine-log-line-prefix': (['--log-line-prefix', '%m [%p] '], 'file', True),
+    'engine-batch': (['--batch'], 'batch', False),
+    'engine-columnar': (['--columnar'], 'file', False),
+    'engine-timeseries': (['--timeseries', 'run.series'], 'file', False),
+    # Дополнительные сводки (задержки, top-K с K больше числа запросов) не меняют основные
+    'engine-latency': (['--latency'], 'file', False),
+    'engine-top-k': (['--top-k', '1000000'], 'file', False),
+}
+
+# Сводки top-K упорядочены по количеству и содержат оценку погрешности: при
+# K больше числа запросов она нулевая, и после ее удаления строки совпадают
+TOP_K_ZERO_ERROR = ' | погрешность ≤0, '.encode()
+
+
+def normalize_top_k(data):
+    """Строки сводки без нулевой погрешности в порядке сортировки"""
+    return b'\n'.join(sorted(data.replace(TOP_K_ZERO_ERROR, b' | ').splitlines()))
+
+
+# Сравнение сводок режима после приведения к общему виду: имя -> функция
+NORMALIZERS = {
+    'engine-top-k': normalize_top_k,
+}
+
+# Режимы с необязательными зависимостями: имя -> модуль, без которого режим пропускается
+MODE_REQUIREMENTS = {
+    'engine-columnar': 'numpy',
+}
+
+
+class LogFuzzer:
+    """Порча сгенерированного лога для проверки краевых случаев.
+
+    Строки случайно (но детерминированно по seed) получают некорректный
+    UTF-8 (чтение с errors='replace'), теряют или портят временную метку,
+    разрываются одиночным \\r, получают \\r\\n, управляющие символы, лишние
+    пробелы, пустые строки и строки-продолжения; последняя строка остается
+    без \\n.
+    """
+
+    def __init__(self, seed=1, rate=0.05):
+        self.random = random.Random(seed)
+        self.rate = rate
+
+    def mutate(self, line):
+        """Испорченный вариант строки (байты) или сама строка"""
+        rnd = self.random
+        if rnd.random() >= self.rate:
+            return [line]
+        kind = rnd.randrange(12)
+        if kind == 0:
+            # Некорректный UTF-8 в середине строки
+            position = rnd.randrange(len(line) + 1)
+            return [line[:position] + rnd.choice([b'\xff', b'\xc3', b'\xe2\x82', b'\xed\xa0\x80']) + line[position:]]
+        if kind == 1:
+            # Строка без временной метки
+            return [line[line.find(b' [') + 1:] if b' [' in line else line]
+        if kind == 2:
+            # Несуществующая дата и время (проходят регулярное выражение, но не strptime)
+            return [b'2024-13-45 25:61:00' + line[19:]]
+        if kind == 3:
+            # Метка без долей секунды и без UTC
+            return [line[:19] + line[line.find(b' [') if b' [' in line else 19:]]
+        if kind == 4:
+            return [line + b'\r']
+        if kind == 5:
+            # Одиночный \r разбивает строку при чтении в текстовом режиме
+            position = rnd.randrange(len(line) + 1)
+            return [line[:position] + b'\r' + line[position:]]
+        if kind == 6:
+            return [line.replace(b';', b'')]
+        if kind == 7:
+            return [line, b'', b'   ']
+        if kind == 8:
+            # Строки-продолжения многострочного запроса
+            return [line.rstrip(b';'), b'\t  AND x = 1', b'  ORDER BY 1;']
+        if kind == 9:
+            # Разделители \x1c-\x1f и пробелы Unicode, которые str.strip считает пробелами
+            return [line + rnd.choice([b'\x1c', b'\x1f ', b'\xc2\xa0', b'\xe2\x80\x83'])]
+        if kind == 10:
+            # Регистр ключевых слов
+            return [line.replace(b'statement:', b'STATEMENT:').replace(b'DETAIL:', b'detail:')]
+        # DETAIL без SQL-операторов в параметрах и с пустыми параметрами
+        return [line, line[:line.find(b']') + 2] + b'DETAIL:  Parameters: $1 = \'42\'' if b']' in line else line]
+
+    def write(self, source, path):
+        """Испорченная копия лога source в path"""
+        with open(source, 'rb') as f:
+            lines = f.read().split(b'\n')
+        if lines and not lines[-1]:
+            lines.pop()
+        mutated = []
+        for line in lines:
+            mutated.extend(self.mutate(line))
+        with open(path, 'wb') as f:
+            # Последняя строка без \n
+            f.write(b'\n'.join(mutated))
+
+
+def read_results(run_dir):
+    """Сравниваемые члены архивов каталога: вид -> содержимое"""
+    results = {}
+    for name in os.listdir(run_dir):
+        if not name.endswith('.tar.gz'):
+            continue
+        with tarfile.open(os.path.join(run_dir, name)) as tar:
+            for member in tar.getmembers():
+                match = RESULT_PATTERN.match(os.path.basename(member.name))
+                # detail_summary пишет каждый эталонный парсер; они одинаковы, берется первый
+                if match and match.group(1) not in results:
+                    results[match.group(1)] = tar.extractfile(member).read()
+    return results
+
+
+def run_script(script, args, run_dir, stdin_path=None):
+    """Запуск скрипта в отдельном каталоге"""
+    os.mkdir(run_dir)
+    stdin = open(stdin_path, 'rb') if stdin_path else subprocess.DEVNULL
+    try:
+        completed = subprocess.run(
+            [sys.executable, script] + args, cwd=run_dir, stdin=stdin,
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        )
+    finally:
+        if stdin_path:
+            stdin.close()
+    if completed.returncode != 0:
+        stderr = completed.stderr.decode('utf-8', errors='replace').strip()
+        raise RuntimeError(f"{os.path.basename(script)} {' '.join(args)}: код {completed.returncode}: {stderr}")
+
+
+def split_log(log, directory):
+    """Копия лога в directory двумя частями; вторая начинается со строки, завершающей запись.
+
+    Такая строка начинается с цифры и не содержит DETAIL: и prepare:, поэтому
+    разбор частей по отдельности учитывает те же записи, что и разбор целиком.
+    """
+    with open(log, 'rb') as f:
+        lines = f.read().split(b'\n')
+    middle = len(lines) // 2
+    for index in range(middle, len(lines)):
+        line = lines[index].lower()
+        if line[:1].isdigit() and b'detail:' not in line and b'prepare:' not in line and b'\r' not in line:
+            middle = index
+            break
+    else:
+        middle = len(lines)
+    os.mkdir(directory)
+    with open(os.path.join(directory, 'part1.log'), 'wb') as f:
+        f.write(b'\n'.join(lines[:middle]) + b'\n')
+    with open(os.path.join(directory, 'part2.log'), 'wb') as f:
+        f.write(b'\n'.join(lines[middle:]))
+
+
+def mode_available(mode):
+    """Установлены ли необязательные зависимости режима"""
+    module = MODE_REQUIREMENTS.get(mode)
+    return module is None or importlib.util.find_spec(module) is not None
+
+
+def describe_difference(kind, expected, actual):
+    """Первые различающиеся строки результата в формате unified diff"""
+    diff = difflib.unified_diff(
+        expected.decode('utf-8', errors='replace').splitlines(),
+        actual.decode('utf-8', errors='replace').splitlines(),
+        f"эталон/{kind}", f"движок/{kind}", lineterm='', n=1,
+    )
+    return '\n'.join(line for _, line in zip(range(12), diff))
+
+
+class DiffTest:
+    """Побайтовое сравнение сводок движка в разных режимах с эталонными парсерами"""
+
+    def __init__(self, work_dir, reference_dir, candidate_dir=SCRIPTS_DIR, modes=None):
+        self.work_dir = work_dir
+        self.reference_dir = reference_dir
+        self.candidate_dir = candidate_dir
+        self.modes = modes or list(ENGINE_MODES)
+        self.skipped = [mode for mode in self.modes if not mode_available(mode)]
+        for mode in self.skipped:
+            print(f"Режим {mode} пропущен: не установлен {MODE_REQUIREMENTS[mode]}")
+        self.modes = [mode for mode in self.modes if mode not in self.skipped]
+        self.runs = 0
+
+    def run_dir(self):
+        self.runs += 1
+        return os.path.join(self.work_dir, f"run{self.runs}")
+
+    def reference(self, log, statements_only):
+        """Сводки эталонных парсеров для лога"""
+        results = {}
+        for script in REFERENCE_SCRIPTS[statements_only]:
+            run_dir = self.run_dir()
+            run_script(os.path.join(self.reference_dir, script), [log], run_dir)
+            for kind, data in read_results(run_dir).items():
+                results.setdefault(kind, data)
+            shutil.rmtree(run_dir)
+        return results
+
+    def candidate(self, log, mode):
+        """Сводки движка в режиме mode"""
+        args, feed, _ = ENGINE_MODES[mode]
+        script = os.path.join(self.candidate_dir, 'multiparser.py')
+        run_dir = self.run_dir()
+        if feed == 'stdin':
+            run_script(script, ['-'] + args, run_dir, stdin_path=log)
+        elif feed == 'gzip':
+            compressed = os.path.join(self.work_dir, os.path.basename(log) + '.gz')
+            if not os.path.exists(compressed):
+                with open(log, 'rb') as src, gzip.open(compressed, 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+            run_script(script, [compressed] + args, run_dir)
+        elif feed == 'batch':
+            parts = os.path.join(self.work_dir, os.path.basename(log) + '.parts')
+            if not os.path.exists(parts):
+                split_log(log, parts)
+            run_script(script, [parts] + args, run_dir)
+        else:
+            run_script(script, [log] + args, run_dir)
+        results = read_results(run_dir)
+        shutil.rmtree(run_dir)
+        return results
+
+    def check(self, log):
+        """Проверка всех режимов на одном логе; список описаний различий"""
+        failures = []
+        references = {}
+        for mode in self.modes:
+            statements_only = ENGINE_MODES[mode][2]
+            if statements_only not in references:
+                references[statements_only] = self.reference(log, statements_only)
+            expected = references[statements_only]
+            actual = self.candidate(log, mode)
+            normalize = NORMALIZERS.get(mode)
+            if normalize is not None:
+                expected = {kind: normalize(data) for kind, data in expected.items()}
+                actual = {kind: normalize(data) for kind, data in actual.items()}
+            mismatched = [kind for kind in RESULT_KINDS if expected.get(kind) != actual.get(kind)]
+            print(f"{os.path.basename(log)} {mode}: {'OK' if not mismatched else 'РАЗЛИЧИЯ ' + ', '.join(mismatched)}")
+            for kind in mismatched:
+                failures.append(
+                    f"{os.path.basename(log)} {mode} {kind}:\n"
+                    + describe_difference(kind, expected.get(kind, b''), actual.get(kind, b''))
+                )
+        return failures
+
+
+def extract_revision(revision, directory):
+    """Файлы ревизии git репозитория difftest.py в directory"""
+    archive = subprocess.run(
+        ['git', '-C', SCRIPTS_DIR, 'archive', '--format=tar', revision],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    if archive.returncode != 0:
+        raise RuntimeError(f"git archive {revision}: {archive.stderr.decode('utf-8', errors='replace').strip()}")
+    os.mkdir(directory)
+    with tarfile.open(fileobj=io.BytesIO(archive.stdout)) as tar:
+        tar.extractall(directory)
+
+
+def build_logs(work_dir, size, seeds, fuzz_seeds):
+    """Сгенерированные логи и их испорченные копии"""
+    logs = []
+    for seed in seeds:
+        path = os.path.join(work_dir, f"generated{seed}.log")
+        LogGenerator(seed=seed, days=2).write(path, size)
+        logs.append(path)
+    for seed in fuzz_seeds:
+        path = os.path.join(work_dir, f"fuzzed{seed}.log")
+        LogFuzzer(seed=seed).write(logs[seed % len(logs)], path)
+        logs.append(path)
+    return logs
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description="Сравнение сводок движка multiparser с эталонными парсерами на сгенерированных логах"
+    )
+    arg_parser.add_argument('--size-mb', type=float, default=2, help="размер сгенерированных логов, МБ")
+    arg_parser.add_argument('--seeds', type=int, nargs='+', default=[1, 2], help="seed сгенерированных логов")
+    arg_parser.add_argument('--fuzz-seeds', type=int, nargs='+', default=[1, 2, 3], help="seed испорченных копий")
+    arg_parser.add_argument('--logs', nargs='+', default=[], help="дополнительные логи для сравнения")
+    arg_parser.add_argument(
+        '--modes', nargs='+', choices=list(ENGINE_MODES), metavar='РЕЖИМ',
+        help=f"проверять только эти режимы: {', '.join(ENGINE_MODES)}"
+    )
+    # Парсеры рядом с difftest.py меняются вместе с движком, поэтому эталон -
+    # неизмененная копия: каталог или ревизия git (например, первый коммит)
+    reference = arg_parser.add_mutually_exclusive_group(required=True)
+    reference.add_argument(
+        '--reference-dir', help="каталог с неизмененными эталонными парсерами (например, git worktree)"
+    )
+    reference.add_argument(
+        '--reference-rev', help="ревизия git, из которой берутся эталонные парсеры (например, baseline)"
+    )
+    arg_parser.add_argument('--candidate-dir', default=SCRIPTS_DIR, help="каталог с проверяемым multiparser.py")
+    args = arg_parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='difftest-')
+    try:
+        reference_dir = args.reference_dir
+        if args.reference_rev:
+            reference_dir = os.path.join(work_dir, 'reference')
+            extract_revision(args.reference_rev, reference_dir)
+        logs = build_logs(work_dir, int(args.size_mb * 1024 * 1024), args.seeds, args.fuzz_seeds)
+        logs += [os.path.abspath(log) for log in args.logs]
+        test = DiffTest(work_dir, os.path.abspath(reference_dir), args.candidate_dir, args.modes)
+        failures = []
+        for log in logs:
+            failures += test.check(log)
+    finally:
+        shutil.rmtree(work_dir)
+
+    for failure in failures:
+        print(failure)
+    skipped = f" (пропущено: {len(test.skipped)})" if test.skipped else ""
+    print(f"Логов: {len(logs)}, режимов: {len(test.modes)}{skipped}, различий: {len(failures)}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
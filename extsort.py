@@ -0,0 +1,120 @@
+import heapq
+import pickle
+import tempfile
+
+# Бюджет памяти на строки по умолчанию и наименьший допустимый бюджет
+DEFAULT_MEMORY_LIMIT = 256 * 1024 * 1024
+MIN_MEMORY_LIMIT = 1024 * 1024
+# Наибольшее число строк в одной записи pickle
+SPILL_BATCH_ROWS = 10000
+# Наибольшее число порций, открытых одновременно (и сливаемых за один проход)
+MERGE_FAN_IN = 32
+# Приблизительные накладные расходы на строку в памяти сверх длины текста
+ROW_OVERHEAD = 300
+
+
+def read_spill(spill):
+    """Строки отсортированной порции из временного файла"""
+    spill.seek(0)
+    while True:
+        try:
+            batch = pickle.load(spill)
+        except EOFError:
+            return
+        yield from batch
+
+
+class ExternalSorter:
+    """Сортировка строк с выгрузкой на диск в пределах бюджета памяти.
+
+    Строки копятся в памяти, пока их оценочный размер меньше memory_limit
+    байт, затем сортируются и сбрасываются во временный файл. Открытых
+    порций не больше MERGE_FAN_IN: при достижении предела половина самых
+    маленьких сливается в одну промежуточную порцию на диске. Записи pickle
+    делаются такими, чтобы при слиянии всех открытых порций в памяти было
+    около memory_limit байт. Строки должны быть уникальны (например,
+    содержать номер строки), тогда порядок порций неважен.
+    """
+
+    def __init__(self, memory_limit=DEFAULT_MEMORY_LIMIT):
+        if memory_limit < MIN_MEMORY_LIMIT:
+            raise ValueError(
+                f"Бюджет памяти {memory_limit} байт меньше минимального {MIN_MEMORY_LIMIT}"
+            )
+        self.memory_limit = memory_limit
+        self.batch_rows = SPILL_BATCH_ROWS
+        self.rows = []
+        self.rows_size = 0
+        # Порции: (число строк, временный файл)
+        self.spills = []
+
+    def add(self, row, size):
+        """Добавление строки с оценочным размером size байт"""
+        self.rows.append(row)
+        self.rows_size += size + ROW_OVERHEAD
+        if self.rows_size >= self.memory_limit:
+            self.spill()
+
+    def spill(self):
+        """Сброс накопленных строк в отсортированную порцию"""
+        self.rows.sort()
+        if not self.spills:
+            # Размер записи по первой порции: она занимает около memory_limit байт
+            self.batch_rows = max(1, min(SPILL_BATCH_ROWS, len(self.rows) // (MERGE_FAN_IN + 1)))
+        spill = self.write_spill(self.rows)
+        self.spills.append((len(self.rows), spill))
+        self.rows = []
+        self.rows_size = 0
+        if len(self.spills) >= MERGE_FAN_IN:
+            self.merge_smallest()
+
+    def write_spill(self, rows):
+        """Запись отсортированных строк во временный файл записями по batch_rows"""
+        spill = tempfile.TemporaryFile()
+        try:
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= self.batch_rows:
+                    pickle.dump(batch, spill, pickle.HIGHEST_PROTOCOL)
+                    batch = []
+            if batch:
+                pickle.dump(batch, spill, pickle.HIGHEST_PROTOCOL)
+        except BaseException:
+            spill.close()
+            raise
+        return spill
+
+    def merge_smallest(self):
+        """Слияние половины самых маленьких порций в одну промежуточную"""
+        self.spills.sort(key=lambda item: item[0])
+        count = MERGE_FAN_IN // 2
+        merged = self.spills[:count]
+        self.spills = self.spills[count:]
+        try:
+            spill = self.write_spill(heapq.merge(*(read_spill(spill) for _, spill in merged)))
+        finally:
+            for _, merged_spill in merged:
+                merged_spill.close()
+        self.spills.append((sum(row_count for row_count, _ in merged), spill))
+
+    def sorted_rows(self):
+        """Все добавленные строки в порядке сортировки"""
+        if not self.spills:
+            self.rows.sort()
+            return iter(self.rows)
+        if self.rows:
+            self.spill()
+        return heapq.merge(*(read_spill(spill) for _, spill in self.spills))
+
+    def close(self):
+        for _, spill in self.spills:
+            spill.close()
+        self.spills = []
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,68 @@
+import re
+import hashlib
+
+# Лексемы, которые заменяются при нормализации, за один проход:
+#   1, 2 - строковый литерал и следующие за ним \w-символы: в прежней нормализации
+#          они сливались с '$str' в одно слово и не считались числом;
+#   3    - целое или дробное число, ограниченное границами слова;
+#   4    - пробельные символы, кроме одиночного пробела.
+TOKEN_PATTERN = re.compile(r"('(?:''|[^'])*')(\w*)|(\b\d+(?:\.\d+)?\b)|(\s{2,}|[^\S ])")
+
+
+def replace_token(match):
+    """Замена лексемы из TOKEN_PATTERN"""
+    index = match.lastindex
+    if index == 2:
+        return '$str' + match.group(2)
+    return '$num' if index == 3 else ' '
+
+
+def normalize_sql(sql):
+    """Нормализация SQL за один проход.
+
+    Результат совпадает с последовательной заменой строк, дробных и целых
+    чисел и схлопыванием пробелов через ' '.join(sql.split()).
+    """
+    return TOKEN_PATTERN.sub(replace_token, sql).strip(' ')
+
+
+def fingerprint_id(normalized_sql):
+    """Стабильный 64-битный идентификатор нормализованного запроса (аналог queryid)"""
+    digest = hashlib.blake2b(normalized_sql.encode('utf-8', errors='surrogatepass'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+class Fingerprinter:
+    """Нормализация SQL с выдачей 64-битных идентификаторов отпечатков.
+
+    Агрегаты хранят компактные целые идентификаторы, а текст каждого
+    отпечатка хранится один раз в self.texts.
+    """
+
+    def __init__(self):
+        self.texts = {}
+        # Обратное отображение текст -> идентификатор: хеш считается один раз на отпечаток
+        self.ids = {}
+        self.collisions = 0
+
+    def fingerprint(self, sql):
+        """Идентификатор отпечатка для исходного текста запроса"""
+        normalized = normalize_sql(sql)
+        fingerprint = self.ids.get(normalized)
+        if fingerprint is None:
+            fingerprint = fingerprint_id(normalized)
+            if self.texts.setdefault(fingerprint, normalized) != normalized:
+                self.collisions += 1
+            self.ids[normalized] = fingerprint
+        return fingerprint
+
+    def text(self, fingerprint):
+        """Нормализованный текст отпечатка"""
+        return self.texts[fingerprint]
+
+    def update(self, texts):
+        """Добавление отпечатков, полученных от другого процесса"""
+        for fingerprint, text in texts.items():
+            if fingerprint not in self.texts:
+                self.texts[fingerprint] = text
+                self.ids[text] = fingerprint
@@ -1,28 +1,48 @@
 import re
-from collections import defaultdict
 import os
+import sys
+
+from extsort import DEFAULT_MEMORY_LIMIT, MIN_MEMORY_LIMIT, ExternalSorter
+from resultstore import ResultStore
+
+# Время ЧЧ:ММ и дата дневной метки
+TIME_PATTERN = re.compile(r"(\d{2}:\d{2})")
+DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
 
 def extract_time_key(timestamp_str):
     """Извлекает ключ времени из временной метки (часы:минуты)"""
     if not timestamp_str:
         return ""
-    
+
+    # Быстрый путь для меток вида ГГГГ-ММ-ДД ЧЧ:ММ...: первое двоеточие в позиции 13
+    if (len(timestamp_str) >= 16 and timestamp_str[13] == ':' and ':' not in timestamp_str[:13]
+            and timestamp_str[11:13].isdecimal() and timestamp_str[14:16].isdecimal()):
+        return timestamp_str[11:16]
+
     # Пытаемся найти время в формате ЧЧ:ММ
-    time_match = re.search(r"(\d{2}:\d{2})", timestamp_str)
+    time_match = TIME_PATTERN.search(timestamp_str)
     if time_match:
         return time_match.group(1)
     
     # Для дневных меток возвращаем "daily"
-    if re.match(r"\d{4}-\d{2}-\d{2}", timestamp_str):
+    if DATE_PATTERN.match(timestamp_str):
         return "daily"
     
     return ""
 
-def group_combined_file(input_file, output_file):
-    """Группирует строки по SQL-запросам с сортировкой по времени"""
-    # Словарь для хранения данных: sql -> [сортированные строки]
-    grouped_data = defaultdict(list)
-    
+def group_combined_file(input_file, output_file, memory_limit=DEFAULT_MEMORY_LIMIT):
+    """Группирует строки по SQL-запросам с сортировкой по времени.
+
+    Строки сортируются по (запрос, ключ времени, номер строки), что дает ту же
+    группировку, что и устойчивая сортировка внутри группы. Порции, не
+    помещающиеся в memory_limit байт, сортируются и сбрасываются во временные
+    файлы, а затем сливаются (extsort.ExternalSorter).
+    """
+    with ExternalSorter(memory_limit) as sorter:
+        group_sorted(input_file, output_file, sorter)
+
+def group_sorted(input_file, output_file, sorter):
+    """Чтение строк объединенного файла в sorter и запись отсортированной группировки"""
     # Определение количества файлов из заголовка
     with open(input_file, 'r', encoding='utf-8') as f:
         header = f.readline().strip()
@@ -37,7 +57,7 @@ def group_combined_file(input_file, output_file):
         count_index = sql_index + 1
         
         # Обработка строк
-        for line in f:
+        for seq, line in enumerate(f):
             line = line.strip()
             if not line:
                 continue
@@ -58,32 +78,53 @@ def group_combined_file(input_file, output_file):
                     sort_key = extract_time_key(ts)
                     break
             
-            # Сохраняем данные для группировки
-            grouped_data[sql].append((sort_key, timestamps, counts))
+            sorter.add((sql, sort_key or "00:00", seq, " | ".join(timestamps), " | ".join(counts)), len(line))
 
-    # Сортировка и запись результатов
+    # Слияние отсортированных порций и запись результатов
     with open(output_file, 'w', encoding='utf-8') as f_out:
         # Записываем заголовок
         f_out.write(header + '\n')
-        
-        # Сортируем группы по SQL-запросу
-        for sql in sorted(grouped_data.keys()):
-            # Сортируем строки внутри группы по временному ключу
-            group_rows = grouped_data[sql]
-            group_rows.sort(key=lambda x: x[0] or "00:00")
-            
-            # Записываем отсортированные строки
-            for _, timestamps, counts in group_rows:
-                line = " | ".join(timestamps) + " | " + sql + " | " + " | ".join(counts)
-                f_out.write(line + '\n')
+
+        for sql, _, _, timestamps, counts in sorter.sorted_rows():
+            f_out.write(timestamps + " | " + sql + " | " + counts + '\n')
+
+def group_store(db_path, run_ids, granularity, output_file):
+    """Группировка запусков из базы SQLite: строки уже упорядочены по запросу и времени"""
+    with ResultStore(db_path) as store, open(output_file, 'w', encoding='utf-8') as f_out:
+        header = " | ".join([f"TimeStamp_{i+1}" for i in range(len(run_ids))])
+        header += " | SQL_Query | " + " | ".join([f"Count_{i+1}" for i in range(len(run_ids))])
+        f_out.write(header + '\n')
+
+        for sql, _, file_data in store.compare_runs(run_ids, granularity):
+            timestamps = [timestamp for timestamp, _ in file_data]
+            counts = [str(count) for _, count in file_data]
+            f_out.write(" | ".join(timestamps) + " | " + sql + " | " + " | ".join(counts) + '\n')
 
 if __name__ == "__main__":
-    input_file = "combined_results.log"
     output_file = "grouped_combined_results.log"
-    
+
+    if len(sys.argv) > 1 and sys.argv[1] == '--db':
+        if len(sys.argv) < 5:
+            print("Использование: python group_combined.py --db база.db minute|hour|day run_id1 [run_id2 ...]")
+            exit(1)
+        group_store(sys.argv[2], [int(run_id) for run_id in sys.argv[4:]], sys.argv[3], output_file)
+        print(f"Результат группировки сохранен в: {output_file}")
+        exit(0)
+
+    input_file = "combined_results.log"
+    memory_limit = DEFAULT_MEMORY_LIMIT
+    if len(sys.argv) == 3 and sys.argv[1] == '--memory-mb':
+        memory_limit = int(sys.argv[2]) * 1024 * 1024
+        if memory_limit < MIN_MEMORY_LIMIT:
+            print(f"Ошибка: --memory-mb должен быть не меньше {MIN_MEMORY_LIMIT // (1024 * 1024)}")
+            exit(1)
+    elif len(sys.argv) > 1:
+        print("Использование: python group_combined.py [--memory-mb N | --db база.db minute|hour|day run_id1 ...]")
+        exit(1)
+
     if not os.path.exists(input_file):
         print(f"Ошибка: Файл {input_file} не найден!")
         exit(1)
     
-    group_combined_file(input_file, output_file)
+    group_combined_file(input_file, output_file, memory_limit)
     print(f"Результат группировки сохранен в: {output_file}")
@@ -0,0 +1,141 @@
+import os
+import time
+from bisect import bisect_left
+
+from logreader import decode_text_lines
+
+
+class IncrementalSummary:
+    """Минутная сводка на диске, в которой переписываются только изменившиеся минуты.
+
+    Строки в файле отсортированы по минутам, поэтому при обновлении файл
+    обрезается по смещению самой ранней изменившейся минуты и дописывается
+    с нее. Обычно это одна-две последние минуты.
+    """
+
+    def __init__(self, filename, parser):
+        self.filename = filename
+        self.parser = parser
+        # Записанные минуты и смещения их первых строк в файле
+        self.minutes = []
+        self.offsets = []
+        with open(self.filename, 'wb'):
+            pass
+
+    def update(self, dirty_minutes):
+        """Перезапись сводки начиная с самой ранней изменившейся минуты"""
+        if not dirty_minutes:
+            return
+        stats = self.parser.stats['minute']
+        earliest = min(dirty_minutes)
+        index = bisect_left(self.minutes, earliest)
+        offset = self.offsets[index] if index < len(self.offsets) else None
+
+        with open(self.filename, 'r+b') as sf:
+            if offset is None:
+                sf.seek(0, os.SEEK_END)
+            else:
+                sf.seek(offset)
+                sf.truncate()
+            del self.minutes[index:]
+            del self.offsets[index:]
+
+            for minute in sorted(minute for minute in stats if minute >= earliest):
+                self.minutes.append(minute)
+                self.offsets.append(sf.tell())
+                sf.write(''.join(self.parser.summary_lines(minute, stats[minute])).encode('utf-8'))
+
+
+class LogFollower:
+    """Слежение за растущим логом как tail -F с периодическим обновлением минутной сводки.
+
+    Переживает ротацию (файл заменен - новый inode) и усечение (размер меньше
+    прочитанного): старый файл дочитывается до конца, новый читается с начала.
+    """
+
+    def __init__(self, parser, interval=10, poll_interval=0.5, from_end=False):
+        self.parser = parser
+        self.path = parser.log_file_path
+        self.interval = interval
+        self.poll_interval = poll_interval
+        self.from_end = from_end
+        self.file = None
+        self.inode = None
+        self.position = 0
+        self.partial = b''
+        self.output_files = {}
+        # Сырые запросы при слежении не сохраняются: файл растет бесконечно
+        parser.write_dumps = False
+        parser.dirty_minutes = set()
+        self.summary = IncrementalSummary(parser.summary_filenames['minute'], parser)
+
+    def open(self, seek_end=False):
+        """Открытие (или повторное открытие после ротации) файла лога"""
+        if self.file is not None:
+            self.file.close()
+        self.file = open(self.path, 'rb')
+        self.inode = os.fstat(self.file.fileno()).st_ino
+        self.position = self.file.seek(0, os.SEEK_END) if seek_end else 0
+        self.partial = b''
+
+    def read_available(self):
+        """Разбор всех полных строк, дописанных с прошлого чтения; True, если что-то прочитано"""
+        data = self.file.read()
+        if not data:
+            return False
+        self.position += len(data)
+        data = self.partial + data
+        end = data.rfind(b'\n') + 1
+        # Неполная последняя строка ждет следующего чтения
+        self.partial = data[end:]
+
+        lines = []
+        for raw in data[:end].splitlines(keepends=True):
+            lines.extend(decode_text_lines(raw))
+        self.parser.read_lines(lines, self.output_files)
+        return True
+
+    def check_rotation(self):
+        """Переход на новый файл после ротации или к началу после усечения"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            # Ротация еще не создала новый файл
+            return
+        if stat.st_ino != self.inode:
+            self.read_available()
+            self.open()
+            print(f"Лог {self.path} заменен, чтение нового файла")
+        elif stat.st_size < self.position:
+            self.open()
+            print(f"Лог {self.path} усечен, чтение с начала")
+
+    def flush_summary(self):
+        """Обновление изменившихся минут в файле сводки"""
+        self.summary.update(self.parser.dirty_minutes)
+        self.parser.dirty_minutes.clear()
+
+    def run(self):
+        """Слежение до прерывания (Ctrl+C)"""
+        self.open(seek_end=self.from_end)
+        last_flush = time.monotonic()
+        print(f"Слежение за {self.path}, сводка: {self.summary.filename}")
+        try:
+            while True:
+                if not self.read_available():
+                    self.check_rotation()
+                    time.sleep(self.poll_interval)
+                if time.monotonic() - last_flush >= self.interval:
+                    self.flush_summary()
+                    last_flush = time.monotonic()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            # Последняя (возможно, неполная) строка и незавершенный запрос учитываются при остановке
+            if self.partial:
+                self.parser.read_lines(decode_text_lines(self.partial), self.output_files)
+                self.partial = b''
+            self.parser.close_dumps(self.output_files)
+            self.flush_summary()
+            if self.file is not None:
+                self.file.close()
@@ -0,0 +1,138 @@
+import sys
+import random
+import argparse
+from datetime import datetime, timedelta
+
+# Шаблоны запросов: {id}, {n} - числа, {name} - строковый литерал, {price} - дробное число.
+# Вес шаблона задает его долю в логе: несколько частых запросов и длинный хвост редких
+QUERY_TEMPLATES = (
+    (30, "SELECT id, name, email FROM users WHERE id = {id}"),
+    (15, "SELECT * FROM orders WHERE user_id = {id} AND status = '{status}' ORDER BY created_at DESC LIMIT {n}"),
+    (10, "UPDATE users SET last_seen = now(), visits = visits + 1 WHERE id = {id}"),
+    (8, "INSERT INTO events (user_id, kind, payload) VALUES ({id}, '{status}', '{name}')"),
+    (6, "SELECT count(*) FROM orders WHERE created_at > now() - interval '{n} minutes'"),
+    (5, "DELETE FROM sessions WHERE expires_at < now() - interval '{n} days'"),
+    (4, "UPDATE orders SET status = '{status}', total = {price} WHERE id = {id}"),
+    (3, "WITH recent AS (SELECT user_id FROM events WHERE id > {id}) SELECT count(*) FROM recent"),
+    (2, "SELECT p.id, p.title FROM products p JOIN stock s ON s.product_id = p.id WHERE s.amount < {n}"),
+    (1, "SELECT name FROM products WHERE title ILIKE '%{name}%' AND price BETWEEN {price} AND {price}"),
+)
+
+# Запросы, которые пишутся в несколько строк (продолжения с отступом)
+MULTILINE_TEMPLATES = (
+    "SELECT u.id, u.name, count(o.id)\n    FROM users u\n    LEFT JOIN orders o ON o.user_id = u.id\n"
+    "    WHERE u.created_at > '{date}'\n    GROUP BY u.id, u.name",
+    "UPDATE stock\n    SET amount = amount - {n}\n    WHERE product_id = {id}",
+)
+
+STATUSES = ('new', 'paid', 'shipped', 'cancelled')
+NAMES = ('alice', 'bob', "o''brien", 'карина', 'zoë', 'test user')
+SERVICE_LINES = (
+    "LOG:  connection received: host=10.0.{a}.{b} port={port}",
+    "LOG:  connection authorized: user=app database=shop",
+    "LOG:  disconnection: session time: 0:00:0{a}.{port} user=app database=shop host=10.0.{a}.{b}",
+    "LOG:  checkpoint starting: time",
+)
+
+
+class LogGenerator:
+    """Детерминированный генератор логов PostgreSQL для тестов и замеров.
+
+    Лог одного seed всегда один и тот же. Строки идут по возрастанию времени
+    с префиксом '%m [%p] ' и содержат простые и многострочные statement,
+    prepare/execute с DETAIL: Parameters, строки duration (в одной строке
+    с запросом и отдельные) и служебные сообщения.
+    """
+
+    def __init__(self, seed=1, start=None, days=1, duration_ratio=0.1, detail_ratio=0.1, multiline_ratio=0.05):
+        self.random = random.Random(seed)
+        self.start = start or datetime(2024, 1, 1)
+        self.days = days
+        self.duration_ratio = duration_ratio
+        self.detail_ratio = detail_ratio
+        self.multiline_ratio = multiline_ratio
+        self.weights = [weight for weight, _ in QUERY_TEMPLATES]
+        self.templates = [template for _, template in QUERY_TEMPLATES]
+
+    def query(self, template=None):
+        """Текст запроса с подставленными литералами"""
+        rnd = self.random
+        template = template or rnd.choices(self.templates, self.weights)[0]
+        return template.format(
+            id=rnd.randint(1, 100000),
+            n=rnd.randint(1, 500),
+            status=rnd.choice(STATUSES),
+            name=rnd.choice(NAMES),
+            price=f"{rnd.uniform(1, 1000):.2f}",
+            date=f"2024-0{rnd.randint(1, 9)}-1{rnd.randint(0, 9)}",
+        )
+
+    def entry(self, prefix):
+        """Строки одной записи лога"""
+        rnd = self.random
+        kind = rnd.random()
+        if kind < 0.03:
+            return [prefix + rnd.choice(SERVICE_LINES).format(
+                a=rnd.randint(0, 9), b=rnd.randint(1, 254), port=rnd.randint(10000, 60000)
+            )]
+        if kind < 0.03 + self.detail_ratio:
+            # Расширенный протокол: prepare (иногда), execute и параметры
+            lines = []
+            if rnd.random() < 0.2:
+                lines.append(f"{prefix}LOG:  prepare S_{rnd.randint(1, 9)}: {self.query()}")
+            lines.append(f"{prefix}LOG:  execute S_{rnd.randint(1, 9)}: {self.query()}")
+            lines.append(
+                f"{prefix}DETAIL:  Parameters: $1 = 'SELECT {rnd.randint(1, 50)}', $2 = '{rnd.choice(NAMES)}'"
+            )
+            return lines
+        if kind < 0.03 + self.detail_ratio + self.multiline_ratio:
+            first, *rest = self.query(rnd.choice(MULTILINE_TEMPLATES)).split('\n')
+            return [f"{prefix}LOG:  statement: {first}"] + rest[:-1] + [rest[-1] + ';']
+        duration = f"{rnd.lognormvariate(0, 1.5):.3f}"
+        if rnd.random() < self.duration_ratio:
+            # log_min_duration_statement: длительность и текст в одной строке
+            return [f"{prefix}LOG:  duration: {duration} ms  statement: {self.query()};"]
+        lines = [f"{prefix}LOG:  statement: {self.query()};"]
+        if rnd.random() < self.duration_ratio:
+            # log_duration: отдельная строка после запроса
+            lines.append(f"{prefix}LOG:  duration: {duration} ms")
+        return lines
+
+    def lines(self, count):
+        """count записей лога, равномерно распределенных по days дням"""
+        step = timedelta(days=self.days) / max(count, 1)
+        for index in range(count):
+            moment = self.start + step * index
+            timestamp = moment.strftime('%Y-%m-%d %H:%M:%S') + f".{moment.microsecond // 1000:03d} UTC"
+            prefix = f"{timestamp} [{self.random.randint(1000, 1063)}] "
+            yield from self.entry(prefix)
+
+    def write(self, path, size):
+        """Запись лога размером около size байт; возвращает число строк"""
+        # Средний размер записи оценивается по пробной выборке того же генератора
+        sample = list(LogGenerator(self.random.random(), self.start, self.days).lines(2000))
+        average = sum(len(line.encode('utf-8')) + 1 for line in sample) / 2000
+        count = max(1, int(size / average))
+        written = 0
+        with open(path, 'w', encoding='utf-8') as f:
+            for line in self.lines(count):
+                f.write(line + '\n')
+                written += 1
+        return written
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Генерация синтетического лога PostgreSQL")
+    arg_parser.add_argument('output', help="файл лога")
+    arg_parser.add_argument('--size-mb', type=float, default=10, help="примерный размер лога, МБ")
+    arg_parser.add_argument('--seed', type=int, default=1, help="seed генератора: один seed - один лог")
+    arg_parser.add_argument('--days', type=int, default=1, help="число дней, по которым распределяются записи")
+    args = arg_parser.parse_args()
+
+    generator = LogGenerator(seed=args.seed, days=args.days)
+    lines = generator.write(args.output, int(args.size_mb * 1024 * 1024))
+    print(f"Записано строк: {lines} в {args.output}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
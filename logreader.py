@@ -0,0 +1,87 @@
+import io
+import os
+import sys
+import bz2
+import gzip
+import lzma
+
+# Потоковые распаковщики по расширению файла
+COMPRESSED_EXTENSIONS = {
+    '.gz': gzip.open,
+    '.bz2': bz2.open,
+    '.xz': lzma.open,
+}
+
+# Сигнатуры сжатых форматов (для файлов без расширения и для stdin)
+COMPRESSED_MAGIC = (
+    (b'\x1f\x8b', gzip.open),
+    (b'BZh', bz2.open),
+    (b'\xfd7zXZ\x00', lzma.open),
+)
+
+STDIN_PATH = '-'
+
+
+def detect_decompressor(path, head):
+    """Распаковщик для лога по расширению или первым байтам (None для обычного текста)"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in COMPRESSED_EXTENSIONS:
+        return COMPRESSED_EXTENSIONS[extension]
+    for magic, decompressor in COMPRESSED_MAGIC:
+        if head.startswith(magic):
+            return decompressor
+    return None
+
+
+def open_log_binary(path):
+    """Открытие лога как потока байт с распаковкой .gz/.bz2/.xz на лету; '-' - stdin"""
+    if path == STDIN_PATH:
+        source = sys.stdin.buffer
+        head = source.peek(6)[:6]
+    else:
+        source = path
+        with open(path, 'rb') as f:
+            head = f.read(6)
+
+    decompressor = detect_decompressor(path, head)
+    if decompressor is not None:
+        return decompressor(source, 'rb')
+    if path == STDIN_PATH:
+        return source
+    return open(path, 'rb')
+
+
+def open_log(path):
+    """Открытие лога в текстовом режиме, как open(path, 'r', encoding='utf-8', errors='replace')"""
+    return io.TextIOWrapper(open_log_binary(path), encoding='utf-8', errors='replace')
+
+
+def decode_text_lines(raw):
+    """Строки из байт одной строки файла, как при чтении в текстовом режиме.
+
+    Одиночный \r в текстовом режиме (universal newlines) тоже разделяет строки.
+    """
+    line = raw.decode('utf-8', errors='replace')
+    if '\r' in line:
+        return line.replace('\r\n', '\n').split('\r')
+    return (line,)
+
+
+def is_seekable_log(path):
+    """Обычный несжатый файл, который можно читать по диапазонам байт"""
+    if path == STDIN_PATH:
+        return False
+    with open(path, 'rb') as f:
+        head = f.read(6)
+    return detect_decompressor(path, head) is None
+
+
+def log_base_name(path):
+    """Имя лога без каталога и расширений (postgresql.log.gz -> postgresql)"""
+    if path == STDIN_PATH:
+        return 'stdin'
+    name = os.path.basename(path)
+    stem, extension = os.path.splitext(name)
+    if extension.lower() in COMPRESSED_EXTENSIONS:
+        name = stem
+    return os.path.splitext(name)[0]
@@ -0,0 +1,94 @@
+import sys
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Кэш с ограничением по числу записей и/или объему и вытеснением по LRU.
+
+    Поддерживает 'key in cache', cache[key] и cache[key] = value, поэтому
+    заменяет обычный словарь кэша нормализации. Проверка наличия и get()
+    учитываются как попадание или промах.
+    """
+
+    def __init__(self, max_entries=100000, max_bytes=None):
+        if max_entries is None and max_bytes is None:
+            raise ValueError("Нужно ограничение по числу записей или по объему")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.data = OrderedDict()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, key):
+        if key in self.data:
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def __getitem__(self, key):
+        self.data.move_to_end(key)
+        return self.data[key]
+
+    def get(self, key, default=None):
+        """Значение по ключу с учетом попадания/промаха"""
+        value = self.data.get(key, default)
+        if value is default:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.data.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key in self.data:
+            self.size_bytes -= self.entry_size(key, self.data[key])
+            self.data.move_to_end(key)
+        self.data[key] = value
+        self.size_bytes += self.entry_size(key, value)
+        self.evict()
+
+    def entry_size(self, key, value):
+        """Приблизительный объем записи в байтах"""
+        return sys.getsizeof(key) + sys.getsizeof(value)
+
+    def evict(self):
+        """Вытеснение самых давних записей сверх ограничений"""
+        data = self.data
+        while data and (
+            (self.max_entries is not None and len(data) > self.max_entries)
+            or (self.max_bytes is not None and self.size_bytes > self.max_bytes)
+        ):
+            key, value = data.popitem(last=False)
+            self.size_bytes -= self.entry_size(key, value)
+            self.evictions += 1
+
+    def clear(self):
+        self.data.clear()
+        self.size_bytes = 0
+
+    def stats(self):
+        """Счетчики кэша для отчета"""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.data),
+            'bytes': self.size_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+        }
+
+    def report(self):
+        """Строка со статистикой кэша"""
+        stats = self.stats()
+        return (
+            f"Кэш нормализации: попаданий {stats['hits']}, промахов {stats['misses']} "
+            f"({stats['hit_ratio']:.1%}), вытеснено {stats['evictions']}, "
+            f"записей {stats['entries']}, ~{stats['bytes'] // 1024} КБ"
+        )
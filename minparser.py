@@ -1,13 +1,26 @@
 import re
 import os
-import glob
+import shutil
+import tempfile
 import tarfile
 from datetime import datetime
 from collections import defaultdict
 
+from lrucache import LRUCache
+from logreader import open_log, log_base_name
+from parallelgzip import ParallelGzipWriter
+
 class PostgresLogParser:
-    def __init__(self, log_file_path):
+    def __init__(self, log_file_path, write_dumps=True, compress_level=9, compress_threads=None,
+                 work_root=None):
         self.log_file_path = log_file_path
+        self.write_dumps = write_dumps
+        # Уровень и число потоков сжатия архива
+        self.compress_level = compress_level
+        self.compress_threads = compress_threads
+        # Каталог, в котором создается рабочий каталог запуска (например, /dev/shm)
+        self.work_root = work_root
+        self.work_dir = None
         # Регулярное выражение для SQL-запросов
         self.log_pattern = re.compile(
             r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(?:\.\d+)?(?: UTC)?).*?:\s+(.*?)(?:;|$)',
@@ -25,26 +38,29 @@ class PostgresLogParser:
         
         # Инициализация структур данных
         self.dates_seen = set()
-        self.sql_cache = {}
+        self.sql_cache = LRUCache()
         self.file_buffers = defaultdict(list)
         self.detail_buffers = defaultdict(list)
         self.detail_counts = defaultdict(lambda: defaultdict(int))
+        self.stats = defaultdict(lambda: defaultdict(int))
         self.buffer_size = 1000
         
         # Инициализация имен файлов
         self.run_timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        self.base_name = os.path.splitext(os.path.basename(log_file_path))[0]
+        self.base_name = log_base_name(log_file_path)
         self.archive_name = f"{self.base_name}-minute_parser-{self.run_timestamp}.tar.gz"
         self.summary_filename = f"summary_minute_{self.base_name}.log"
         self.detail_summary_filename = f"detail_summary_{self.base_name}.log"
 
     def parse(self):
         output_files = {}
+        # Свой рабочий каталог: параллельные запуски не трогают файлы друг друга
+        self.work_dir = tempfile.mkdtemp(prefix=f"{self.base_name}-", dir=self.work_root)
         current_query = None
         current_timestamp = None
 
         try:
-            with open(self.log_file_path, 'r', encoding='utf-8', errors='replace') as f:
+            with open_log(self.log_file_path) as f:
                 for line in f:
                     line = line.strip()
                     if not line:
@@ -82,6 +98,7 @@ class PostgresLogParser:
             self.generate_detail_summary()
             self.compress_results()
             self.cleanup_files()
+            print(self.sql_cache.report())
 
     def process_detail(self, timestamp, params):
         """Обработка DETAIL: Parameters записей"""
@@ -95,6 +112,12 @@ class PostgresLogParser:
             
             # Увеличиваем счетчик для этого типа параметров
             self.detail_counts[date_part][normalized] += 1
+
+            # Сводка учитывает и DETAIL записи, как раньше через DETAIL_<дата>.log
+            self.count_statement(timestamp, normalized)
+
+            if not self.write_dumps:
+                return
             
             # Добавляем в буфер для записи в файл
             detail_filename = f"DETAIL_{date_part}.log"
@@ -109,13 +132,13 @@ class PostgresLogParser:
         if filename:
             buffer = self.detail_buffers.get(filename, [])
             if buffer:
-                with open(filename, 'a', encoding='utf-8') as f:
+                with open(self.work_path(filename), 'a', encoding='utf-8') as f:
                     f.writelines(buffer)
                 self.detail_buffers[filename] = []
         else:
             for filename, buffer in self.detail_buffers.items():
                 if buffer:
-                    with open(filename, 'a', encoding='utf-8') as f:
+                    with open(self.work_path(filename), 'a', encoding='utf-8') as f:
                         f.writelines(buffer)
                     self.detail_buffers[filename] = []
 
@@ -142,9 +165,13 @@ class PostgresLogParser:
         date_part = query['timestamp'].split()[0]
         self.dates_seen.add(date_part)
 
+        self.count_statement(query['timestamp'], self.normalize_sql(sql))
+        if not self.write_dumps:
+            return
+
         filename = f"{operator}_{date_part}.log"
         if filename not in output_files:
-            output_files[filename] = open(filename, 'a', encoding='utf-8')
+            output_files[filename] = open(self.work_path(filename), 'a', encoding='utf-8')
 
         self.file_buffers[filename].append(f"{query['timestamp']} | {sql}\n")
         if len(self.file_buffers[filename]) >= self.buffer_size:
@@ -174,44 +201,27 @@ class PostgresLogParser:
         self.sql_cache[sql] = normalized
         return normalized
 
-    def generate_combined_summary(self):
-        """Генерация сводки по минутам"""
-        stats = defaultdict(lambda: defaultdict(int))
-        cache = self.sql_cache
-
-        for date in self.dates_seen:
-            for file_path in glob.glob(f'*_{date}.log'):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    for line in f:
-                        parts = line.split(' | ', 1)
-                        if len(parts) < 2:
-                            continue
-
-                        timestamp, sql = parts
-                        sql = sql.strip()
-                        
-                        if sql in cache:
-                            normalized_sql = cache[sql]
-                        else:
-                            normalized_sql = self.normalize_sql(sql)
-                        
-                        try:
-                            ts_clean = timestamp[:19]
-                            dt = datetime.strptime(ts_clean, '%Y-%m-%d %H:%M:%S')
-                            minute_key = dt.replace(second=0).strftime('%Y-%m-%d %H:%M')
-                        except ValueError:
-                            continue
+    def count_statement(self, timestamp, normalized_sql):
+        """Учет нормализованного запроса в сводке"""
+        try:
+            ts_clean = timestamp[:19]
+            dt = datetime.strptime(ts_clean, '%Y-%m-%d %H:%M:%S')
+            minute_key = dt.replace(second=0).strftime('%Y-%m-%d %H:%M')
+        except ValueError:
+            return
 
-                        stats[minute_key][normalized_sql] += 1
+        self.stats[minute_key][normalized_sql] += 1
 
-        with open(self.summary_filename, 'w', encoding='utf-8') as sf:
-            for minute in sorted(stats):
-                for sql, count in sorted(stats[minute].items()):
+    def generate_combined_summary(self):
+        """Генерация сводки по минутам"""
+        with open(self.work_path(self.summary_filename), 'w', encoding='utf-8') as sf:
+            for minute in sorted(self.stats):
+                for sql, count in sorted(self.stats[minute].items()):
                     sf.write(f"{minute} | {sql} | выполнился {count} раз\n")
 
     def generate_detail_summary(self):
         """Генерация сводки по DETAIL: Parameters"""
-        with open(self.detail_summary_filename, 'w', encoding='utf-8') as sf:
+        with open(self.work_path(self.detail_summary_filename), 'w', encoding='utf-8') as sf:
             for date in sorted(self.detail_counts):
                 for params, count in sorted(self.detail_counts[date].items()):
                     sf.write(f"{date} | {params} | встретился {count} раз\n")
@@ -220,44 +230,55 @@ class PostgresLogParser:
         """Создание архива с результатами"""
         files_to_archive = []
         # Основные сводки
-        if os.path.exists(self.summary_filename):
+        if os.path.exists(self.work_path(self.summary_filename)):
             files_to_archive.append(self.summary_filename)
-        if os.path.exists(self.detail_summary_filename):
+        if os.path.exists(self.work_path(self.detail_summary_filename)):
             files_to_archive.append(self.detail_summary_filename)
         
         # Файлы запросов
         for date in self.dates_seen:
             for operator in ['SELECT', 'INSERT', 'UPDATE', 'DELETE', 'OTHER']:
                 filename = f"{operator}_{date}.log"
-                if os.path.exists(filename):
+                if os.path.exists(self.work_path(filename)):
                     files_to_archive.append(filename)
             
             # DETAIL файлы
             detail_filename = f"DETAIL_{date}.log"
-            if os.path.exists(detail_filename):
+            if os.path.exists(self.work_path(detail_filename)):
                 files_to_archive.append(detail_filename)
         
         # Создание архива
         if files_to_archive:
-            with tarfile.open(self.archive_name, "w:gz") as tar:
-                for file in files_to_archive:
-                    tar.add(file)
+            with ParallelGzipWriter(self.archive_name, level=self.compress_level, threads=self.compress_threads) as gz:
+                with tarfile.open(fileobj=gz, mode="w|") as tar:
+                    for file in files_to_archive:
+                        tar.add(self.work_path(file), arcname=file)
             print(f"Результаты сохранены в архив: {self.archive_name}")
 
+    def work_path(self, filename):
+        """Путь к файлу в рабочем каталоге запуска"""
+        return os.path.join(self.work_dir, filename)
+
     def cleanup_files(self):
-        """Очистка временных файлов"""
-        for file in glob.glob("*.log"):
-            if file != self.log_file_path and file != self.archive_name:
-                try:
-                    os.remove(file)
-                except Exception as e:
-                    print(f"Ошибка при удалении файла {file}: {e}")
+        """Удаление рабочего каталога запуска со всеми промежуточными файлами"""
+        try:
+            shutil.rmtree(self.work_dir)
+        except Exception as e:
+            print(f"Ошибка при удалении каталога {self.work_dir}: {e}")
 
 if __name__ == '__main__':
-    import sys
-    if len(sys.argv) != 2:
-        print("Использование: python minute_parser.py <путь_к_файлу_лога>")
-        sys.exit(1)
+    import argparse
+    arg_parser = argparse.ArgumentParser(description="Сводка запросов лога PostgreSQL по минутам")
+    arg_parser.add_argument('log_file', help="путь к файлу лога (.gz/.bz2/.xz или - для stdin)")
+    arg_parser.add_argument(
+        '--no-dumps', action='store_true',
+        help="не сохранять сырые запросы SELECT_/INSERT_/.../DETAIL_ в архив"
+    )
+    arg_parser.add_argument(
+        '--work-dir',
+        help="каталог для рабочих файлов запуска (например, /dev/shm); по умолчанию системный временный"
+    )
+    args = arg_parser.parse_args()
 
-    parser = PostgresLogParser(sys.argv[1])
+    parser = PostgresLogParser(args.log_file, write_dumps=not args.no_dumps, work_root=args.work_dir)
     parser.parse()
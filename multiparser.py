@@ -0,0 +1,1504 @@
+import re
+import os
+import sys
+import glob
+import gzip
+import mmap
+import shutil
+import tempfile
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from datetime import datetime
+from collections import defaultdict
+
+from lrucache import LRUCache
+from fingerprint import Fingerprinter
+from logreader import open_log, log_base_name, is_seekable_log, decode_text_lines, STDIN_PATH
+from prefixparser import LogLinePrefix
+from logfollow import LogFollower
+from checkpoint import (
+    log_identity, same_log, encode_state, decode_state, save_checkpoint, load_checkpoint
+)
+from resultstore import ResultStore
+from tarstream import write_archive
+from parallelgzip import ParallelGzipWriter
+from sketches import LatencySketch, SpaceSaving, DistinctSketch
+from profiling import StageProfiler, ProgressReporter, TimedPattern
+from columnar import ColumnarCounts, columnar_available
+from timeseries import MinuteSeries
+
+# Гранулярности сводок, которые строятся за один проход по логу
+GRANULARITIES = ('minute', 'hour', 'day')
+
+# Байты, при которых строка разбирается через str: не-ASCII (Unicode-регистр и пробелы
+# в регулярных выражениях), \x1c-\x1f (пробелы для str.strip) и одиночный \r
+SLOW_PATH_BYTES = re.compile(rb'[\x1c-\x1f\r\x80-\xff]')
+
+# Длительность выполнения (log_min_duration_statement или log_duration) и pid из префикса
+DURATION_PATTERN = re.compile(r'LOG:  duration: (\d+(?:\.\d+)?) ms')
+PID_PATTERN = re.compile(r'\[(\d+)\]')
+
+# Счетчиков SpaceSaving на одно место top-K: погрешность count не больше total / (K * TOP_K_FACTOR)
+TOP_K_FACTOR = 10
+
+# Меток (с точностью до секунды) в кэше ключей сводок: лог идет по времени,
+# поэтому нужны только последние секунды, а память не растет на длинных логах и в --follow
+BUCKET_CACHE_SIZE = 4096
+# Отличает отсутствие метки в кэше от закэшированной некорректной метки (None)
+MISSING = object()
+
+# Шаг, с которым при показе хода разбора обновляется прогресс последовательного разбора
+PROGRESS_STEP = 16 * 1024 * 1024
+
+
+class MultiLogParser:
+    """Парсер, строящий минутную, часовую и дневную сводки за одно чтение лога.
+
+    Поведение разбора совпадает с minparser.py/hourparser.py/dayparser.py,
+    а при statements_only=True - с minparser2.py/hourparser2.py/dayparser2.py.
+    """
+
+    def __init__(self, log_file_path, statements_only=False, write_dumps=True, workers=1,
+                 use_mmap=True, log_line_prefix=None, cache_size=100000, cache_bytes=None,
+                 checkpoint_path=None, checkpoint_every=64 * 1024 * 1024, sqlite_path=None,
+                 compress_level=9, compress_threads=None, work_root=None, latency=False,
+                 top_k=None, detail_cardinality=False, write_detail_dumps=True,
+                 profile_path=None, progress=False, columnar=False, timeseries_path=None):
+        self.log_file_path = log_file_path
+        # Разбор по log_line_prefix учитывает только statement/execute, как *parser2.py
+        self.statements_only = statements_only or bool(log_line_prefix)
+        self.line_prefix = LogLinePrefix(log_line_prefix) if log_line_prefix else None
+        # Запись сырых запросов в файлы SELECT_/INSERT_/.../DETAIL_ (для архива)
+        self.write_dumps = write_dumps
+        # Запись сырых DETAIL: Parameters в DETAIL_<дата>.log (отдельно от остальных файлов запросов)
+        self.write_detail_dumps = write_detail_dumps
+        # Количество процессов для разбора лога по диапазонам байт
+        self.workers = workers
+        # Разбор несжатого файла по отображенным в память байтам
+        self.use_mmap = use_mmap
+        # Контрольная точка для продолжения разбора и период ее сохранения в байтах лога
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_every = checkpoint_every
+        # База SQLite, в которую дополнительно сохраняются счетчики сводок
+        self.sqlite_path = sqlite_path
+        # Уровень gzip и число потоков сжатия файлов запросов и сводок
+        self.compress_level = compress_level
+        self.compress_threads = compress_threads or os.cpu_count()
+        self.compressor = None
+        self.compress_block = gzip.compress
+        # Каталог, в котором создается рабочий каталог запуска (например, /dev/shm)
+        self.work_root = work_root
+        self.work_dir = None
+        # Статистика задержек: гранулярность -> ключ времени -> отпечаток -> LatencySketch
+        self.latency = {granularity: defaultdict(dict) for granularity in GRANULARITIES} if latency else None
+        # Последний запрос каждого процесса (pid -> (метка, отпечаток)) для отдельных строк duration;
+        # None - длительность уже учтена
+        self.last_statements = {}
+        # Первые строки duration процессов, чей запрос был до начала разобранного диапазона
+        self.orphan_durations = {}
+        # Регулярное выражение для SQL-запросов
+        if self.statements_only:
+            # Только тело statement/execute, как в *parser2.py
+            self.log_pattern = re.compile(
+                r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(?:\.\d+)?(?: UTC)?).*?(?:statement|execute \S+):\s+(.*?)(?:;|$)',
+                re.IGNORECASE
+            )
+        else:
+            self.log_pattern = re.compile(
+                r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(?:\.\d+)?(?: UTC)?).*?:\s+(.*?)(?:;|$)',
+                re.IGNORECASE
+            )
+        # Регулярное выражение для DETAIL: Parameters
+        self.detail_pattern = re.compile(
+            r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(?:\.\d+)?(?: UTC)?).*?DETAIL:\s+Parameters:\s+(.*)$',
+            re.IGNORECASE
+        )
+        # Те же выражения для разбора ASCII-строк без декодирования. В строке без \n
+        # ленивое '(.*?)(?:;|$)' захватывает то же, что и '([^;]*)', но без перебора
+        self.log_pattern_bytes = re.compile(
+            self.log_pattern.pattern.replace('(.*?)(?:;|$)', '([^;]*)').encode(), re.IGNORECASE
+        )
+        self.detail_pattern_bytes = re.compile(self.detail_pattern.pattern.encode(), re.IGNORECASE)
+        # Нормализация SQL в 64-битные идентификаторы отпечатков
+        self.fingerprinter = Fingerprinter()
+        # Профилирование этапов разбора с отчетом в JSON-файл profile_path
+        self.profile_path = profile_path
+        self.profiler = StageProfiler() if profile_path else None
+        if self.profiler is not None:
+            # Горячие функции оборачиваются только при профилировании, без затрат в обычном режиме
+            self.fingerprinter.fingerprint = self.profiler.wrap('normalize', self.fingerprinter.fingerprint)
+            self.write_member = self.profiler.wrap('dump_writes', self.write_member)
+            # Внутри parse отдельно учитываются чтение строк (read) и сопоставление с выражениями (match)
+            self.log_pattern = TimedPattern(self.log_pattern, self.profiler, 'match')
+            self.detail_pattern = TimedPattern(self.detail_pattern, self.profiler, 'match')
+            self.log_pattern_bytes = TimedPattern(self.log_pattern_bytes, self.profiler, 'match')
+            self.detail_pattern_bytes = TimedPattern(self.detail_pattern_bytes, self.profiler, 'match')
+            if self.line_prefix is not None:
+                self.line_prefix.match = self.profiler.wrap('match', self.line_prefix.match)
+            # Блоки файлов запросов сжимаются в пуле потоков по ходу разбора:
+            # время сжатия суммируется по потокам пула
+            self.compress_block = self.profiler.wrap('compress', gzip.compress, shared=True)
+        # Печать хода разбора (ProgressReporter создается в parse, когда известен объем)
+        self.show_progress = progress
+        self.progress = None
+        # Строки лога, прошедшие через циклы разбора (для отчета профилирования)
+        self.lines_read = 0
+
+        # Инициализация структур данных
+        self.dates_seen = set()
+        # Кэш исходный текст -> отпечаток ограничен, чтобы память не росла на миллионах литералов
+        self.sql_cache = LRUCache(cache_size, cache_bytes)
+        self.file_buffers = defaultdict(list)
+        self.detail_buffers = defaultdict(list)
+        self.detail_counts = defaultdict(lambda: defaultdict(int))
+        # Число различных наборов параметров: дата -> отпечаток DETAIL -> DistinctSketch
+        self.detail_cardinality = defaultdict(dict) if detail_cardinality else None
+        # Счетчики сводок: гранулярность -> ключ времени -> отпечаток запроса -> количество
+        self.stats = {granularity: defaultdict(lambda: defaultdict(int)) for granularity in GRANULARITIES}
+        # Режим top-K: в сводках только K самых частых запросов каждого ключа времени,
+        # а вместо всех отпечатков хранится SpaceSaving на TOP_K_FACTOR * K счетчиков
+        self.top_k = top_k
+        if top_k:
+            self.stats = {
+                granularity: defaultdict(lambda: SpaceSaving(top_k * TOP_K_FACTOR))
+                for granularity in GRANULARITIES
+            }
+        # Поминутные ряды (день -> отпечаток -> 1440 счетчиков или разреженный ряд):
+        # минутная сводка строится из них, а сами ряды сохраняются в timeseries_path
+        self.timeseries_path = timeseries_path
+        self.timeseries = MinuteSeries() if timeseries_path else None
+        self.bucket_cache = LRUCache(BUCKET_CACHE_SIZE)
+        # Колоночный подсчет (numpy): записи копятся в столбцах и попадают в self.stats
+        # только при flush_columnar(); метки, которые он не разбирает, считаются как обычно
+        self.columnar = ColumnarCounts(self.count_statement) if columnar else None
+        if self.columnar is not None:
+            self.count_statement = self.columnar.add
+        # Минуты, изменившиеся с последнего обновления сводки (только в режиме слежения)
+        self.dirty_minutes = None
+        self.current_query = None
+        # Члены архива (файлы запросов и сводки) -> несжатый размер; их содержимое
+        # пишется сразу в отдельные gzip-файлы, из которых собирается архив
+        self.member_sizes = {}
+        # Суффикс файлов запросов (у частей параллельного разбора - .partN)
+        self.dump_suffix = ''
+        self.buffer_size = 1000
+
+        # Инициализация имен файлов
+        self.run_timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        self.base_name = log_base_name(log_file_path)
+        self.archive_name = f"{self.base_name}-multi_parser-{self.run_timestamp}.tar.gz"
+        self.summary_filenames = {
+            granularity: f"summary_{granularity}_{self.base_name}.log"
+            for granularity in GRANULARITIES
+        }
+        self.detail_summary_filename = f"detail_summary_{self.base_name}.log"
+        self.detail_cardinality_filename = f"detail_cardinality_{self.base_name}.log"
+        self.latency_filenames = {
+            granularity: f"latency_{granularity}_{self.base_name}.log"
+            for granularity in GRANULARITIES
+        }
+
+    def parse(self):
+        output_files = {}
+        self.work_dir = self.create_work_dir()
+        if self.show_progress:
+            if is_seekable_log(self.log_file_path):
+                self.progress = ProgressReporter(os.path.getsize(self.log_file_path))
+            else:
+                print("Ход разбора показывается только для несжатого файла лога")
+
+        try:
+            with self.stage('parse'):
+                if self.checkpoint_path:
+                    self.parse_with_checkpoints(output_files)
+                elif self.workers > 1 and is_seekable_log(self.log_file_path):
+                    self.parse_parallel()
+                else:
+                    if self.workers > 1:
+                        print("Сжатый лог и stdin разбираются последовательно")
+                    self.read_log(output_files)
+        finally:
+            self.close_dumps(output_files)
+            if self.progress is not None:
+                self.progress.finish()
+            self.count_parsed([self.log_file_path])
+            self.write_results()
+
+    def parse_batch(self, log_files):
+        """Разбор набора логов в пуле процессов в общие сводки и один архив.
+
+        Ошибка в одном файле не прерывает остальные: его счетчики и файлы
+        запросов отбрасываются. Возвращает список файлов с ошибками.
+        """
+        self.work_dir = self.create_work_dir()
+        options = self.worker_options()
+        failed = []
+        sizes = [os.path.getsize(path) for path in log_files]
+        if self.show_progress:
+            self.progress = ProgressReporter(sum(sizes))
+
+        try:
+            with self.stage('parse'), ProcessPoolExecutor(max_workers=self.workers) as executor:
+                futures = [
+                    executor.submit(parse_file, path, index, self.work_dir, options)
+                    for index, path in enumerate(log_files)
+                ]
+                done = 0
+                # Слияние в порядке файлов сохраняет порядок строк в файлах запросов
+                for index, (path, future) in enumerate(zip(log_files, futures)):
+                    try:
+                        state = future.result()
+                    except Exception as e:
+                        print(f"Ошибка разбора {path}: {e}")
+                        failed.append(path)
+                        continue
+                    finally:
+                        done += sizes[index]
+                        if self.progress is not None:
+                            self.progress.update(done)
+                    self.merge_part(state, f".file{index}")
+        finally:
+            if self.progress is not None:
+                self.progress.finish()
+            self.count_parsed([path for path in log_files if path not in failed])
+            self.write_results()
+        print(f"Разобрано файлов: {len(log_files) - len(failed)} из {len(log_files)}")
+        return failed
+
+    def read_log(self, output_files):
+        """Последовательный разбор всего лога"""
+        if self.progress is not None:
+            self.read_log_with_progress(output_files)
+        elif self.use_mmap and is_seekable_log(self.log_file_path):
+            self.parse_range(0, None, output_files)
+        else:
+            with open_log(self.log_file_path) as f:
+                self.read_lines(f, output_files)
+
+    def read_log_with_progress(self, output_files):
+        """Разбор несжатого лога по участкам PROGRESS_STEP байт с обновлением хода разбора"""
+        size = os.path.getsize(self.log_file_path)
+        offset = 0
+        with open(self.log_file_path, 'rb') as f:
+            while offset < size:
+                f.seek(min(offset + PROGRESS_STEP, size))
+                f.readline()
+                end = min(f.tell(), size)
+                self.parse_range(offset, end, output_files)
+                offset = end
+                self.progress.update(offset)
+
+    def write_results(self):
+        """Сводки, сохранение в базу, архив и удаление рабочего каталога"""
+        with self.stage('summaries'):
+            self.flush_columnar()
+            self.generate_summaries()
+            self.generate_detail_summary()
+            self.generate_detail_cardinality()
+            self.generate_latency_summaries()
+        with self.stage('store'):
+            self.store_results()
+            self.write_timeseries()
+        with self.stage('archive'):
+            self.compress_results()
+        with self.stage('cleanup'):
+            self.cleanup_files()
+            self.shutdown_compressor()
+        print(self.sql_cache.report())
+        self.write_profile()
+
+    def stage(self, name):
+        """Этап профилирования (пустой контекст без профилирования)"""
+        return self.profiler.stage(name) if self.profiler is not None else nullcontext()
+
+    def count_parsed(self, log_files):
+        """Объем разобранных логов и число учтенных записей для отчета профилирования"""
+        if self.profiler is None:
+            return
+        self.profiler.count(
+            'parse',
+            bytes=sum(os.path.getsize(path) for path in log_files if path != STDIN_PATH),
+            lines=self.lines_read,
+            statements=self.counted_statements(),
+        )
+
+    def counted_statements(self):
+        """Число записей, учтенных в дневной сводке (запросы и DETAIL)"""
+        self.flush_columnar()
+        if self.top_k:
+            return sum(counts.total for counts in self.stats['day'].values())
+        return sum(sum(counts.values()) for counts in self.stats['day'].values())
+
+    def write_profile(self):
+        """Отчет профилирования с эффективностью кэша нормализации"""
+        if self.profiler is None:
+            return
+        cache = self.sql_cache
+        lookups = cache.hits + cache.misses
+        self.profiler.extra = {
+            'log': self.log_file_path,
+            'workers': self.workers,
+            'cache': {
+                'hits': cache.hits,
+                'misses': cache.misses,
+                'evictions': cache.evictions,
+                'hit_ratio': cache.hits / lookups if lookups else None,
+            },
+        }
+        self.profiler.write(self.profile_path)
+        print(f"Профиль разбора сохранен в {self.profile_path}")
+
+    def create_work_dir(self):
+        """Рабочий каталог запуска: параллельные запуски не трогают файлы друг друга.
+
+        При разборе с контрольной точкой каталог постоянный (рядом с ней),
+        чтобы после сбоя дописывать те же файлы запросов.
+        """
+        if self.checkpoint_path:
+            work_dir = f"{self.checkpoint_path}.work"
+            os.makedirs(work_dir, exist_ok=True)
+            return work_dir
+        return tempfile.mkdtemp(prefix=f"{self.base_name}-", dir=self.work_root)
+
+    def read_lines(self, lines, output_files):
+        """Разбор строк лога подходящим для настроек способом"""
+        if self.profiler is not None:
+            lines = self.profiler.iterate('read', lines)
+        if self.line_prefix is not None:
+            self.process_prefixed_lines(lines, output_files)
+        else:
+            self.process_lines(lines, output_files)
+
+    def process_prefixed_lines(self, lines, output_files):
+        """Разбор строк по log_line_prefix: одно совпадение на строку и выбор по типу сообщения"""
+        current_query = self.current_query
+        match_prefix = self.line_prefix.match
+        prefix_fields = self.line_prefix.fields
+        lines_read = 0
+
+        try:
+            for line in lines:
+                lines_read += 1
+                line = line.strip()
+                if not line:
+                    continue
+
+                match = match_prefix(line)
+                # DETAIL: Parameters не завершает запрос: следующие строки-продолжения
+                # дописываются к нему, как в *parser2.py
+                if match is not None:
+                    params = match.group('params')
+                    if params is not None:
+                        self.process_detail(match.group('timestamp'), params.strip())
+                        continue
+                elif line[0].isdigit():
+                    # Строка с меткой, но не по префиксу (например, испорченный pid),
+                    # разбирается общими выражениями *parser2.py
+                    detail_match = self.detail_pattern.match(line)
+                    if detail_match:
+                        timestamp, params = detail_match.groups()
+                        self.process_detail(timestamp.strip(), params.strip())
+                        continue
+
+                # Строки с prepare пропускаются целиком, как в *parser2.py
+                if 'prepare:' in line.lower():
+                    continue
+
+                if match is None:
+                    if line[0].isdigit():
+                        # Строка с цифры без префикса, как и раньше, завершает запрос
+                        if current_query:
+                            self.buffer_query(current_query, output_files)
+                        current_query = None
+                        log_match = self.log_pattern.match(line)
+                        if log_match:
+                            timestamp, sql = log_match.groups()
+                            current_query = {'timestamp': timestamp.strip(), 'sql': sql.strip()}
+                        if self.latency is not None:
+                            pid = self.line_pid(line, log_match.start(2) if log_match else len(line))
+                            self.note_duration(line, current_query, pid)
+                    elif current_query:
+                        current_query['sql'] += ' ' + line
+                    continue
+
+                # Любая другая строка с префиксом завершает предыдущий запрос
+                if current_query:
+                    self.buffer_query(current_query, output_files)
+                    current_query = None
+
+                sql = match.group('sql')
+                if sql is not None:
+                    current_query = {'timestamp': match.group('timestamp'), 'sql': sql.strip()}
+                    current_query.update(prefix_fields(match))
+                    if self.latency is not None:
+                        self.note_duration(line, current_query, current_query.get('pid'))
+                    continue
+
+                if self.latency is not None and match.group('severity'):
+                    self.note_duration(line, None, prefix_fields(match).get('pid'))
+        finally:
+            self.current_query = current_query
+            self.lines_read += lines_read
+
+    def process_lines(self, lines, output_files):
+        """Разбор последовательности строк лога"""
+        current_query = self.current_query
+        lines_read = 0
+
+        try:
+            for line in lines:
+                lines_read += 1
+                line = line.strip()
+                if not line:
+                    continue
+
+                # Проверка на DETAIL: Parameters
+                detail_match = self.detail_pattern.match(line)
+                if detail_match:
+                    timestamp, params = detail_match.groups()
+                    self.process_detail(timestamp.strip(), params.strip())
+                    continue
+
+                # Пропуск prepare-запросов
+                if self.statements_only and "prepare:" in line.lower():
+                    continue
+
+                # Обработка обычных записей лога
+                if line[0].isdigit():
+                    if current_query:
+                        self.buffer_query(current_query, output_files)
+                    match = self.log_pattern.match(line)
+                    if match:
+                        timestamp, sql = match.groups()
+                        current_query = {'timestamp': timestamp.strip(), 'sql': sql.strip()}
+                        if self.latency is not None:
+                            self.note_duration(line, current_query, self.line_pid(line, match.start(2)))
+                    else:
+                        current_query = None
+                        if self.latency is not None:
+                            self.note_duration(line, None, self.line_pid(line, len(line)))
+                elif current_query:
+                    current_query['sql'] += ' ' + line
+        finally:
+            self.current_query = current_query
+            self.lines_read += lines_read
+
+    def parse_range(self, start, end, output_files):
+        """Разбор диапазона байт несжатого лога (end=None - до конца файла)"""
+        with open(self.log_file_path, 'rb') as f:
+            if self.use_mmap and self.line_prefix is None:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    self.process_mapped(data, start, len(data) if end is None else end, output_files)
+            else:
+                f.seek(start)
+                self.read_lines(iter_text_lines(f, end), output_files)
+
+    def process_mapped(self, data, start, end, output_files):
+        """Разбор строк data[start:end] по байтам.
+
+        Строки классифицируются без декодирования; декодируются только
+        сохраняемые временные метки и тексты запросов. Строки с байтами из
+        SLOW_PATH_BYTES передаются в process_lines, поэтому результат
+        совпадает с чтением файла в текстовом режиме.
+        """
+        current_query = self.current_query
+        detail_match = self.detail_pattern_bytes.match
+        log_match = self.log_pattern_bytes.match
+        slow_path = SLOW_PATH_BYTES.search
+        statements_only = self.statements_only
+        find = data.find if self.profiler is None else self.profiler.wrap('read', data.find)
+        position = start
+        # Строки медленного пути считает process_lines
+        lines_read = 0
+
+        try:
+            while position < end:
+                newline = find(b'\n', position, end)
+                if newline < 0:
+                    newline = end
+                line = data[position:newline]
+                position = newline + 1
+
+                if line.endswith(b'\r'):
+                    line = line[:-1]
+                if slow_path(line):
+                    self.current_query = current_query
+                    self.process_lines(line.decode('utf-8', errors='replace').split('\r'), output_files)
+                    current_query = self.current_query
+                    continue
+
+                lines_read += 1
+                line = line.strip()
+                if not line:
+                    continue
+                lowered = line.lower()
+
+                # Проверка на DETAIL: Parameters (регулярное выражение - только если есть DETAIL:)
+                if b'detail:' in lowered:
+                    detail = detail_match(line)
+                    if detail:
+                        timestamp, params = detail.groups()
+                        self.process_detail(timestamp.strip().decode(), params.strip().decode())
+                        continue
+
+                # Пропуск prepare-запросов
+                if statements_only and b'prepare:' in lowered:
+                    continue
+
+                # Обработка обычных записей лога
+                if 48 <= line[0] <= 57:
+                    if current_query:
+                        self.buffer_query(current_query, output_files)
+                    match = log_match(line)
+                    if match:
+                        timestamp, sql = match.groups()
+                        current_query = {'timestamp': timestamp.strip().decode(), 'sql': sql.strip().decode()}
+                        if self.latency is not None:
+                            text = line.decode()
+                            self.note_duration(text, current_query, self.line_pid(text, match.start(2)))
+                    else:
+                        current_query = None
+                        if self.latency is not None:
+                            text = line.decode()
+                            self.note_duration(text, None, self.line_pid(text, len(text)))
+                elif current_query:
+                    current_query['sql'] += ' ' + line.decode()
+        finally:
+            self.current_query = current_query
+            self.lines_read += lines_read
+
+    def close_dumps(self, output_files):
+        """Учет незавершенного запроса и сброс всех буферов в файлы"""
+        if self.current_query:
+            self.buffer_query(self.current_query, output_files)
+            self.current_query = None
+        self.flush_buffers(output_files)
+        self.flush_detail_buffers()
+        for file in output_files.values():
+            file.close()
+
+    def is_chunk_boundary(self, line):
+        """Строка, с которой разбор не зависит от предыдущих строк лога"""
+        line = line.strip()
+        if not line:
+            return False
+        # С log_line_prefix запись завершает любая строка с префиксом
+        if self.line_prefix is not None:
+            return line[0].isdigit() or self.line_prefix.match(line) is not None
+        if not line[0].isdigit():
+            return False
+        # DETAIL и prepare не завершают текущий многострочный запрос
+        if self.detail_pattern.match(line):
+            return False
+        if self.statements_only and "prepare:" in line.lower():
+            return False
+        return True
+
+    def find_chunk_boundaries(self, chunks):
+        """Деление файла на диапазоны байт по началам строк с временной меткой"""
+        size = os.path.getsize(self.log_file_path)
+        boundaries = [0]
+
+        with open(self.log_file_path, 'rb') as f:
+            for i in range(1, chunks):
+                target = max(size * i // chunks, boundaries[-1])
+                f.seek(target)
+                # Пропускаем неполную строку
+                if target:
+                    f.readline()
+                while True:
+                    position = f.tell()
+                    raw = f.readline()
+                    if not raw:
+                        break
+                    first_line = raw.decode('utf-8', errors='replace').split('\r', 1)[0]
+                    if self.is_chunk_boundary(first_line):
+                        if position > boundaries[-1]:
+                            boundaries.append(position)
+                        break
+
+        if size > boundaries[-1]:
+            boundaries.append(size)
+        return list(zip(boundaries, boundaries[1:]))
+
+    def parse_parallel(self):
+        """Разбор диапазонов лога в пуле процессов со слиянием счетчиков"""
+        ranges = self.find_chunk_boundaries(self.workers)
+        options = self.worker_options()
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = [
+                executor.submit(parse_chunk, self.log_file_path, start, end, index, self.work_dir, options)
+                for index, (start, end) in enumerate(ranges)
+            ]
+            if self.progress is not None:
+                sizes = {future: end - start for future, (start, end) in zip(futures, ranges)}
+                done = 0
+                for future in as_completed(futures):
+                    done += sizes[future]
+                    self.progress.update(done)
+            states = [future.result() for future in futures]
+
+        # Слияние в порядке диапазонов сохраняет порядок строк в файлах запросов
+        for index, state in enumerate(states):
+            self.merge_part(state, f".part{index}")
+
+    def worker_options(self):
+        """Настройки парсеров в процессах пула"""
+        return {
+            'statements_only': self.statements_only,
+            'write_dumps': self.write_dumps,
+            'write_detail_dumps': self.write_detail_dumps,
+            'use_mmap': self.use_mmap,
+            'log_line_prefix': self.line_prefix.prefix if self.line_prefix else None,
+            'cache_size': self.sql_cache.max_entries,
+            'cache_bytes': self.sql_cache.max_bytes,
+            'compress_level': self.compress_level,
+            # Потоки сжатия делятся между процессами
+            'compress_threads': max(1, self.compress_threads // self.workers),
+            'latency': self.latency is not None,
+            'top_k': self.top_k,
+            'detail_cardinality': self.detail_cardinality is not None,
+            'columnar': self.columnar is not None,
+            'timeseries_path': self.timeseries_path,
+            # Процессы пула замеряют обернутые функции (normalize, match, read, dump_writes, compress), но отчет не пишут
+            'profile_path': self.profile_path,
+        }
+
+    def merge_part(self, state, suffix):
+        """Слияние результатов процесса пула: счетчики и файлы запросов с суффиксом suffix.
+
+        Части - самостоятельные gzip-потоки, поэтому склеиваются без распаковки.
+        """
+        for name in state['member_sizes']:
+            part_path = os.path.join(self.work_dir, f"{name}{suffix}.gz")
+            mode = 'ab' if name in self.member_sizes else 'wb'
+            with open(part_path, 'rb') as src, open(self.member_path(name), mode) as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(part_path)
+        self.merge_state(state)
+
+        # Строки duration в начале части относятся к запросам из предыдущих частей
+        if self.latency is not None:
+            for pid, microseconds in state['orphan_durations']:
+                previous = self.last_statements.pop(pid, None)
+                if previous is not None:
+                    self.record_latency(previous[0], previous[1], microseconds)
+            for pid, previous in state['last_statements']:
+                self.last_statements[pid] = previous
+
+    def parse_with_checkpoints(self, output_files):
+        """Последовательный разбор с сохранением контрольной точки каждые checkpoint_every байт.
+
+        Если контрольная точка относится к этому же логу, разбор продолжается
+        с сохраненного смещения с восстановленными счетчиками и незавершенным
+        запросом, поэтому сводки совпадают с полным повторным разбором.
+        """
+        identity = log_identity(self.log_file_path)
+        offset = self.resume_from_checkpoint()
+        # Сырые запросы сбрасываются на диск только вместе с контрольной точкой
+        self.buffer_size = float('inf')
+
+        with open(self.log_file_path, 'rb') as f:
+            # Последняя строка без \n может дописываться: контрольные точки - только до нее
+            complete_size = last_line_end(f, identity['size'])
+            while offset < complete_size:
+                f.seek(min(offset + self.checkpoint_every, complete_size))
+                f.readline()
+                end = min(f.tell(), complete_size)
+                self.parse_range(offset, end, output_files)
+                offset = end
+                self.save_checkpoint(identity, offset, output_files)
+                if self.progress is not None:
+                    self.progress.update(offset)
+
+        if complete_size < identity['size']:
+            self.parse_range(complete_size, identity['size'], output_files)
+
+    def checkpoint_settings(self):
+        """Настройки разбора, с которыми контрольная точка совместима"""
+        return {
+            'statements_only': self.statements_only,
+            'log_line_prefix': self.line_prefix.prefix if self.line_prefix else None,
+            'write_dumps': self.write_dumps,
+            'latency': self.latency is not None,
+            'top_k': self.top_k,
+            'write_detail_dumps': self.write_detail_dumps,
+            'detail_cardinality': self.detail_cardinality is not None,
+            'timeseries': self.timeseries is not None,
+        }
+
+    def resume_from_checkpoint(self):
+        """Восстановление состояния из контрольной точки; смещение, с которого продолжать"""
+        checkpoint = load_checkpoint(self.checkpoint_path)
+        if checkpoint is None:
+            return 0
+        if checkpoint['settings'] != self.checkpoint_settings():
+            raise ValueError(f"Контрольная точка {self.checkpoint_path} сохранена с другими настройками разбора")
+        if not same_log(checkpoint['log'], self.log_file_path, checkpoint['offset']):
+            print(f"Контрольная точка {self.checkpoint_path} относится к другому логу, разбор с начала")
+            return 0
+
+        self.merge_state(decode_state(checkpoint['state']))
+        self.current_query = checkpoint['current_query']
+        self.last_statements = {pid: previous and tuple(previous) for pid, previous in checkpoint['state']['last_statements']}
+        # Отбрасываем записанное в файлы запросов после контрольной точки: на ней
+        # gzip-потоки были завершены, поэтому обрезка оставляет целые gzip-члены
+        for name, length in checkpoint['dump_lengths'].items():
+            path = self.member_path(name)
+            if not os.path.exists(path) or os.path.getsize(path) < length:
+                # Файл уже упакован в архив прошлого запуска: запросы пишутся заново
+                self.member_sizes.pop(name, None)
+            elif os.path.getsize(path) > length:
+                os.truncate(path, length)
+        print(f"Продолжение разбора с байта {checkpoint['offset']}")
+        return checkpoint['offset']
+
+    def save_checkpoint(self, identity, offset, output_files):
+        """Сохранение смещения, незавершенного запроса и счетчиков"""
+        self.flush_buffers(output_files)
+        # Закрытие завершает gzip-члены; следующая запись начнет новый член
+        for file in output_files.values():
+            file.close()
+        output_files.clear()
+        self.flush_detail_buffers()
+
+        state = self.export_state()
+        # Замеры прошлых запусков не смешиваются с этапами текущего
+        state.pop('profile')
+        save_checkpoint(self.checkpoint_path, {
+            'log': identity,
+            'offset': offset,
+            'settings': self.checkpoint_settings(),
+            'current_query': self.current_query,
+            'state': encode_state(state),
+            'dump_lengths': {
+                name: os.path.getsize(self.member_path(name))
+                for name in self.member_sizes if os.path.exists(self.member_path(name))
+            },
+        })
+
+    def export_state(self):
+        """Накопленные счетчики в виде обычных словарей (для передачи между процессами)"""
+        self.flush_columnar()
+        return {
+            'dates_seen': sorted(self.dates_seen),
+            'stats': {
+                granularity: {
+                    bucket: counts.to_state() if self.top_k else dict(counts)
+                    for bucket, counts in self.stats[granularity].items()
+                }
+                for granularity in GRANULARITIES
+            },
+            'top_k': self.top_k,
+            'timeseries': self.timeseries.to_state() if self.timeseries is not None else None,
+            'detail_counts': {date: dict(counts) for date, counts in self.detail_counts.items()},
+            'detail_cardinality': {
+                date: {fingerprint: sketch.to_state() for fingerprint, sketch in sketches.items()}
+                for date, sketches in self.detail_cardinality.items()
+            } if self.detail_cardinality is not None else None,
+            'fingerprints': self.fingerprinter.texts,
+            'member_sizes': dict(self.member_sizes),
+            'latency': {
+                granularity: {
+                    bucket: {fingerprint: sketch.to_state() for fingerprint, sketch in sketches.items()}
+                    for bucket, sketches in self.latency[granularity].items()
+                }
+                for granularity in GRANULARITIES
+            } if self.latency is not None else None,
+            'last_statements': list(self.last_statements.items()),
+            'orphan_durations': list(self.orphan_durations.items()),
+            'lines_read': self.lines_read,
+            'profile': self.profiler.stages if self.profiler is not None else None,
+            'cache': {
+                'hits': self.sql_cache.hits,
+                'misses': self.sql_cache.misses,
+                'evictions': self.sql_cache.evictions,
+            },
+        }
+
+    def merge_state(self, state):
+        """Слияние счетчиков, полученных от export_state"""
+        self.dates_seen.update(state['dates_seen'])
+        for granularity in GRANULARITIES:
+            stats = self.stats[granularity]
+            for bucket, counts in state['stats'][granularity].items():
+                bucket_stats = stats[bucket]
+                if self.top_k:
+                    bucket_stats.merge(SpaceSaving.from_state(counts))
+                    continue
+                for fingerprint, count in counts.items():
+                    bucket_stats[fingerprint] += count
+        if self.timeseries is not None:
+            self.timeseries.merge_state(state['timeseries'])
+        for date, counts in state['detail_counts'].items():
+            date_counts = self.detail_counts[date]
+            for params, count in counts.items():
+                date_counts[params] += count
+        if self.detail_cardinality is not None:
+            for date, sketches in state['detail_cardinality'].items():
+                date_sketches = self.detail_cardinality[date]
+                for fingerprint, sketch_state in sketches.items():
+                    sketch = DistinctSketch.from_state(sketch_state)
+                    if fingerprint in date_sketches:
+                        date_sketches[fingerprint].merge(sketch)
+                    else:
+                        date_sketches[fingerprint] = sketch
+        for name, size in state['member_sizes'].items():
+            self.member_sizes[name] = self.member_sizes.get(name, 0) + size
+        self.fingerprinter.update(state['fingerprints'])
+        # Статистика кэшей и число строк процессов суммируются в отчет основного процесса
+        self.lines_read += state['lines_read']
+        # Время обернутых функций процессов пула суммируется (может превышать время этапа parse)
+        if self.profiler is not None and state.get('profile'):
+            self.profiler.merge(state['profile'])
+        self.sql_cache.hits += state['cache']['hits']
+        self.sql_cache.misses += state['cache']['misses']
+        self.sql_cache.evictions += state['cache']['evictions']
+        if self.latency is not None:
+            for granularity in GRANULARITIES:
+                latency = self.latency[granularity]
+                for bucket, sketches in state['latency'][granularity].items():
+                    bucket_sketches = latency[bucket]
+                    for fingerprint, sketch_state in sketches.items():
+                        sketch = LatencySketch.from_state(sketch_state)
+                        if fingerprint in bucket_sketches:
+                            bucket_sketches[fingerprint].merge(sketch)
+                        else:
+                            bucket_sketches[fingerprint] = sketch
+
+    def process_detail(self, timestamp, params):
+        """Обработка DETAIL: Parameters записей"""
+        # Проверяем наличие SQL-операторов в параметрах
+        if any(op in params.upper() for op in ['SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH']):
+            date_part = timestamp.split()[0]
+            self.dates_seen.add(date_part)
+
+            # Нормализуем параметры для группировки
+            fingerprint = self.fingerprint_sql(params)
+
+            # Увеличиваем счетчик для этого типа параметров
+            self.detail_counts[date_part][fingerprint] += 1
+
+            # Различные наборы параметров отпечатка считаются по исходному тексту
+            if self.detail_cardinality is not None:
+                sketches = self.detail_cardinality[date_part]
+                sketch = sketches.get(fingerprint)
+                if sketch is None:
+                    sketch = sketches[fingerprint] = DistinctSketch()
+                sketch.add(params)
+
+            # Сводки учитывают и DETAIL записи (раньше они попадали туда через DETAIL_<дата>.log)
+            self.count_statement(timestamp, fingerprint)
+
+            if not self.write_dumps or not self.write_detail_dumps:
+                return
+
+            # Добавляем в буфер для записи в файл
+            detail_filename = f"DETAIL_{date_part}.log"
+            self.detail_buffers[detail_filename].append(f"{timestamp} | {params}\n")
+
+            # Сбрасываем буфер при заполнении
+            if len(self.detail_buffers[detail_filename]) >= self.buffer_size:
+                self.flush_detail_buffer(detail_filename)
+
+    def flush_detail_buffer(self, filename=None):
+        """Сброс буфера DETAIL записей в файл"""
+        if filename:
+            buffer = self.detail_buffers.get(filename, [])
+            if buffer:
+                with self.open_member(filename) as f:
+                    self.write_member(f, filename, buffer)
+                self.detail_buffers[filename] = []
+        else:
+            for filename, buffer in self.detail_buffers.items():
+                if buffer:
+                    with self.open_member(filename) as f:
+                        self.write_member(f, filename, buffer)
+                    self.detail_buffers[filename] = []
+
+    def flush_detail_buffers(self):
+        """Сброс всех DETAIL буферов"""
+        self.flush_detail_buffer()
+
+    def buffer_query(self, query, output_files):
+        """Буферизация SQL-запросов"""
+        if not query or 'sql' not in query:
+            return
+
+        sql = query['sql'].rstrip(';')
+        first_word = sql.split()[0].upper() if sql else ''
+
+        # Пропуск PREPARE-запросов
+        if self.statements_only and first_word == 'PREPARE':
+            return
+
+        # Определяем тип оператора
+        if first_word == 'WITH':
+            operator = 'SELECT'
+        elif first_word in ('SELECT', 'INSERT', 'UPDATE', 'DELETE'):
+            operator = first_word
+        else:
+            operator = 'OTHER'
+
+        date_part = query['timestamp'].split()[0]
+        self.dates_seen.add(date_part)
+
+        fingerprint = self.fingerprint_sql(sql)
+        self.count_statement(query['timestamp'], fingerprint)
+        if self.latency is not None:
+            self.track_latency(query, fingerprint)
+
+        if not self.write_dumps:
+            return
+
+        filename = f"{operator}_{date_part}.log"
+        if filename not in output_files:
+            output_files[filename] = self.open_member(filename)
+
+        self.file_buffers[filename].append(f"{query['timestamp']} | {sql}\n")
+        if len(self.file_buffers[filename]) >= self.buffer_size:
+            self.write_member(output_files[filename], filename, self.file_buffers[filename])
+            self.file_buffers[filename] = []
+
+    def flush_buffers(self, output_files):
+        """Сброс буферов SQL-запросов"""
+        for filename, buffer in self.file_buffers.items():
+            if buffer and filename in output_files:
+                self.write_member(output_files[filename], filename, buffer)
+        self.file_buffers.clear()
+
+    def member_path(self, name):
+        """Путь к gzip-файлу с содержимым члена архива"""
+        return os.path.join(self.work_dir, f"{name}{self.dump_suffix}.gz")
+
+    def open_member(self, name):
+        """Открытие gzip-потока члена архива; повторное открытие дописывает новый gzip-член"""
+        mode = 'ab' if name in self.member_sizes else 'wb'
+        self.member_sizes.setdefault(name, 0)
+        if self.compressor is None:
+            self.compressor = ThreadPoolExecutor(max_workers=self.compress_threads)
+        return ParallelGzipWriter(
+            self.member_path(name), mode, self.compress_level,
+            self.compress_threads, executor=self.compressor, compress=self.compress_block,
+        )
+
+    def shutdown_compressor(self):
+        """Остановка пула потоков сжатия"""
+        if self.compressor is not None:
+            self.compressor.shutdown()
+            self.compressor = None
+
+    def write_member(self, file, name, lines):
+        """Запись строк в gzip-поток члена архива с учетом несжатого размера"""
+        data = ''.join(lines).encode('utf-8')
+        file.write(data)
+        self.member_sizes[name] += len(data)
+
+    def fingerprint_sql(self, sql):
+        """Идентификатор отпечатка нормализованного SQL-запроса для группировки"""
+        fingerprint = self.sql_cache.get(sql)
+        if fingerprint is None:
+            fingerprint = self.fingerprinter.fingerprint(sql)
+            self.sql_cache[sql] = fingerprint
+        return fingerprint
+
+    def bucket_keys(self, timestamp):
+        """Минутный и часовой ключи для временной метки (None для некорректной метки)"""
+        ts_clean = timestamp[:19]
+        keys = self.bucket_cache.get(ts_clean, MISSING)
+        if keys is not MISSING:
+            return keys
+
+        try:
+            dt = datetime.strptime(ts_clean, '%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            keys = None
+        else:
+            minute_key = dt.strftime('%Y-%m-%d %H:%M')
+            keys = (minute_key, minute_key[:14] + '00')
+
+        self.bucket_cache[ts_clean] = keys
+        return keys
+
+    def count_statement(self, timestamp, fingerprint):
+        """Учет отпечатка запроса в сводках всех гранулярностей"""
+        if self.top_k:
+            self.count_top_k(timestamp, fingerprint)
+            return
+        stats = self.stats
+        stats['day'][timestamp.split()[0]][fingerprint] += 1
+
+        # Минутный и часовой ключи строятся только для корректных меток
+        keys = self.bucket_keys(timestamp)
+        if keys is not None:
+            minute_key, hour_key = keys
+            if self.timeseries is not None:
+                self.timeseries.add(minute_key, fingerprint)
+            else:
+                stats['minute'][minute_key][fingerprint] += 1
+            stats['hour'][hour_key][fingerprint] += 1
+            if self.dirty_minutes is not None:
+                self.dirty_minutes.add(minute_key)
+
+    def flush_columnar(self):
+        """Перенос счетчиков колоночного подсчета в self.stats"""
+        if self.columnar is not None:
+            self.columnar.drain_into(self.stats)
+
+    def count_top_k(self, timestamp, fingerprint):
+        """Учет отпечатка запроса в сводках SpaceSaving режима top-K"""
+        stats = self.stats
+        stats['day'][timestamp.split()[0]].add(fingerprint)
+
+        keys = self.bucket_keys(timestamp)
+        if keys is not None:
+            minute_key, hour_key = keys
+            stats['minute'][minute_key].add(fingerprint)
+            stats['hour'][hour_key].add(fingerprint)
+            if self.dirty_minutes is not None:
+                self.dirty_minutes.add(minute_key)
+
+    def line_pid(self, line, end):
+        """pid из префикса строки ('[1234]' до позиции end) или None"""
+        match = PID_PATTERN.search(line, 0, end)
+        return match.group(1) if match else None
+
+    def note_duration(self, line, query, pid):
+        """Длительность из строки 'duration: X ms' для статистики задержек.
+
+        С текстом запроса в той же строке (log_min_duration_statement) она
+        относится к этому запросу, а отдельная строка (log_duration) - к
+        предыдущему запросу того же процесса.
+        """
+        if query is not None:
+            query['pid'] = pid
+        duration = DURATION_PATTERN.search(line)
+        if duration is None:
+            return
+        # В целых микросекундах суммы точны и не зависят от порядка слияния
+        microseconds = round(float(duration.group(1)) * 1000)
+        if line[duration.end():].strip():
+            if query is not None:
+                query['duration'] = microseconds
+            return
+
+        if query is not None:
+            query['duration_line'] = True
+        if pid not in self.last_statements:
+            self.orphan_durations.setdefault(pid, microseconds)
+        previous = self.last_statements.get(pid)
+        self.last_statements[pid] = None
+        if previous is not None:
+            self.record_latency(previous[0], previous[1], microseconds)
+
+    def track_latency(self, query, fingerprint):
+        """Учет длительности завершенного запроса или запоминание его для строки duration"""
+        if 'duration' in query:
+            self.record_latency(query['timestamp'], fingerprint, query['duration'])
+        elif not query.get('duration_line'):
+            self.last_statements[query.get('pid')] = (query['timestamp'], fingerprint)
+
+    def record_latency(self, timestamp, fingerprint, microseconds):
+        """Добавление длительности (мкс) в скетчи всех гранулярностей"""
+        buckets = [('day', timestamp.split()[0])]
+        keys = self.bucket_keys(timestamp)
+        if keys is not None:
+            buckets += [('minute', keys[0]), ('hour', keys[1])]
+        for granularity, bucket in buckets:
+            sketches = self.latency[granularity][bucket]
+            sketch = sketches.get(fingerprint)
+            if sketch is None:
+                sketch = sketches[fingerprint] = LatencySketch()
+            sketch.add(microseconds)
+
+    def generate_summaries(self):
+        """Генерация сводок по минутам, часам и дням из накопленных счетчиков"""
+        for granularity in GRANULARITIES:
+            self.write_summary(self.summary_filenames[granularity], self.summary_buckets(granularity))
+
+    def summary_buckets(self, granularity):
+        """Пары (ключ времени, счетчики) сводки в порядке ключей"""
+        if granularity == 'minute' and self.timeseries is not None:
+            return self.timeseries.minute_buckets()
+        stats = self.stats[granularity]
+        return ((bucket, stats[bucket]) for bucket in sorted(stats))
+
+    def write_summary(self, filename, buckets):
+        """Запись сводки в формате 'время | запрос | выполнился N раз'"""
+        with self.open_member(filename) as sf:
+            for bucket, counts in buckets:
+                self.write_member(sf, filename, self.summary_lines(bucket, counts))
+
+    def summary_lines(self, bucket, counts):
+        """Строки сводки для одного ключа времени"""
+        if self.top_k:
+            # count - верхняя оценка, истинное число не меньше count - error
+            text = self.fingerprinter.text
+            return [
+                f"{bucket} | {sql} | погрешность ≤{error}, выполнился {count} раз\n"
+                for sql, count, error in sorted(
+                    (text(fingerprint), count, error) for fingerprint, count, error in counts.top(self.top_k)
+                )
+            ]
+        return [f"{bucket} | {sql} | выполнился {count} раз\n" for sql, count in self.sorted_texts(counts)]
+
+    def sorted_texts(self, counts):
+        """Пары (текст запроса, количество), отсортированные по тексту"""
+        text = self.fingerprinter.text
+        return sorted((text(fingerprint), count) for fingerprint, count in counts.items())
+
+    def generate_detail_summary(self):
+        """Генерация сводки по DETAIL: Parameters"""
+        with self.open_member(self.detail_summary_filename) as sf:
+            for date in sorted(self.detail_counts):
+                self.write_member(sf, self.detail_summary_filename, [
+                    f"{date} | {params} | встретился {count} раз\n"
+                    for params, count in self.sorted_texts(self.detail_counts[date])
+                ])
+
+    def generate_detail_cardinality(self):
+        """Сводка по DETAIL: оценка числа различных наборов параметров каждого отпечатка"""
+        if self.detail_cardinality is None:
+            return
+        filename = self.detail_cardinality_filename
+        text = self.fingerprinter.text
+        with self.open_member(filename) as sf:
+            for date in sorted(self.detail_cardinality):
+                counts = self.detail_counts[date]
+                self.write_member(sf, filename, [
+                    # Различных наборов не больше, чем записей
+                    f"{date} | {params} | различных наборов ≈{min(round(sketch.estimate()), counts[fingerprint])}, "
+                    f"встретился {counts[fingerprint]} раз\n"
+                    for params, fingerprint, sketch in sorted(
+                        (text(fingerprint), fingerprint, sketch)
+                        for fingerprint, sketch in self.detail_cardinality[date].items()
+                    )
+                ])
+
+    def generate_latency_summaries(self):
+        """Сводки задержек: количество, сумма, среднее и квантили по ключам времени"""
+        if self.latency is None:
+            return
+        text = self.fingerprinter.text
+        for granularity in GRANULARITIES:
+            filename = self.latency_filenames[granularity]
+            latency = self.latency[granularity]
+            with self.open_member(filename) as sf:
+                for bucket in sorted(latency):
+                    sketches = latency[bucket]
+                    self.write_member(sf, filename, [
+                        f"{bucket} | {sql} | выполнений {sketch.count}, всего {sketch.total / 1000:.3f} мс, "
+                        f"среднее {sketch.mean() / 1000:.3f} мс, p50 {sketch.quantile(0.5) / 1000:.3f} мс, "
+                        f"p95 {sketch.quantile(0.95) / 1000:.3f} мс, p99 {sketch.quantile(0.99) / 1000:.3f} мс\n"
+                        for sql, sketch in sorted((text(fingerprint), sketch) for fingerprint, sketch in sketches.items())
+                    ])
+
+    def store_results(self):
+        """Сохранение отпечатков и счетчиков в базу SQLite (если задана)"""
+        if not self.sqlite_path:
+            return
+        with ResultStore(self.sqlite_path) as store:
+            run_id = store.store_run(
+                os.path.abspath(self.log_file_path) if self.log_file_path != STDIN_PATH else self.base_name,
+                self.fingerprinter.texts, self.stored_stats(), self.detail_counts,
+            )
+        print(f"Результаты сохранены в {self.sqlite_path}, запуск {run_id}")
+
+    def write_timeseries(self):
+        """Сохранение поминутных рядов в бинарный файл (если задан)"""
+        if self.timeseries is None:
+            return
+        self.timeseries.write(self.timeseries_path, self.fingerprinter.texts)
+        print(f"Поминутные ряды сохранены в {self.timeseries_path}")
+
+    def stored_stats(self):
+        """Счетчики сводок для базы: в режиме top-K - только попавшие в сводки запросы"""
+        if self.timeseries is not None:
+            return dict(self.stats, minute=dict(self.timeseries.minute_buckets()))
+        if not self.top_k:
+            return self.stats
+        return {
+            granularity: {
+                bucket: {fingerprint: count for fingerprint, count, _ in counts.top(self.top_k)}
+                for bucket, counts in buckets.items()
+            }
+            for granularity, buckets in self.stats.items()
+        }
+
+    def compress_results(self):
+        """Создание архива с результатами из уже сжатых gzip-файлов членов"""
+        names = [self.summary_filenames[granularity] for granularity in GRANULARITIES]
+        names.append(self.detail_summary_filename)
+        names.append(self.detail_cardinality_filename)
+        names.extend(self.latency_filenames[granularity] for granularity in GRANULARITIES)
+        # Файлы запросов
+        for date in sorted(self.dates_seen):
+            for operator in ['SELECT', 'INSERT', 'UPDATE', 'DELETE', 'OTHER', 'DETAIL']:
+                names.append(f"{operator}_{date}.log")
+
+        members = [
+            (name, self.member_path(name), self.member_sizes[name])
+            for name in names if name in self.member_sizes
+        ]
+        if members:
+            write_archive(self.archive_name, members, self.compress_level)
+            print(f"Результаты сохранены в архив: {self.archive_name}")
+
+    def cleanup_files(self):
+        """Удаление рабочего каталога запуска со всеми промежуточными файлами"""
+        try:
+            shutil.rmtree(self.work_dir)
+        except Exception as e:
+            print(f"Ошибка при удалении каталога {self.work_dir}: {e}")
+
+
+def iter_text_lines(f, end=None):
+    """Строки бинарного файла с текущей позиции до end, как при чтении в текстовом режиме"""
+    position = f.tell()
+    for raw in f:
+        if end is not None and position >= end:
+            break
+        position += len(raw)
+        yield from decode_text_lines(raw)
+
+
+def last_line_end(f, size):
+    """Смещение сразу после последнего \\n в первых size байтах файла"""
+    position = size
+    while position > 0:
+        block_start = max(0, position - 65536)
+        f.seek(block_start)
+        newline = f.read(position - block_start).rfind(b'\n')
+        if newline >= 0:
+            return block_start + newline + 1
+        position = block_start
+    return 0
+
+
+def parse_chunk(log_file_path, start, end, index, work_dir, options):
+    """Разбор диапазона байт лога в отдельном процессе"""
+    parser = MultiLogParser(log_file_path, **options)
+    parser.work_dir = work_dir
+    parser.dump_suffix = f".part{index}"
+    output_files = {}
+
+    try:
+        parser.parse_range(start, end, output_files)
+    finally:
+        parser.close_dumps(output_files)
+        parser.shutdown_compressor()
+    return parser.export_state()
+
+
+def parse_file(log_file_path, index, work_dir, options):
+    """Разбор одного лога из набора в отдельном процессе.
+
+    При ошибке файлы запросов этого лога удаляются, а ошибка передается
+    основному процессу.
+    """
+    parser = MultiLogParser(log_file_path, **options)
+    parser.work_dir = work_dir
+    parser.dump_suffix = f".file{index}"
+    output_files = {}
+
+    try:
+        parser.read_log(output_files)
+        parser.close_dumps(output_files)
+    except Exception:
+        for file in output_files.values():
+            try:
+                file.close()
+            except Exception:
+                pass
+        for name in parser.member_sizes:
+            if os.path.exists(parser.member_path(name)):
+                os.remove(parser.member_path(name))
+        raise
+    finally:
+        parser.shutdown_compressor()
+    return parser.export_state()
+
+
+def expand_log_files(pattern):
+    """Логи набора: все файлы каталога или файлы по шаблону glob, по имени"""
+    if os.path.isdir(pattern):
+        paths = [os.path.join(pattern, name) for name in os.listdir(pattern) if not name.startswith('.')]
+    else:
+        paths = glob.glob(pattern)
+    return sorted(path for path in paths if os.path.isfile(path))
+
+
+def batch_log_path(pattern):
+    """Путь, по которому называются сводки и архив набора: каталог логов"""
+    directory = pattern if os.path.isdir(pattern) else os.path.dirname(pattern)
+    return os.path.abspath(directory or '.')
+
+
+def build_arg_parser():
+    arg_parser = argparse.ArgumentParser(
+        description="Сводки по минутам, часам и дням за один проход по логу PostgreSQL"
+    )
+    arg_parser.add_argument(
+        'log_file',
+        help="путь к файлу лога (.gz/.bz2/.xz или - для stdin); с --batch - каталог или шаблон glob"
+    )
+    arg_parser.add_argument(
+        '--batch', action='store_true',
+        help="разобрать все логи каталога или шаблона в общие сводки и один архив"
+    )
+    arg_parser.add_argument(
+        '--no-dumps', action='store_true',
+        help="не сохранять сырые запросы SELECT_/INSERT_/.../DETAIL_ в архив"
+    )
+    arg_parser.add_argument(
+        '--workers', type=int, default=1,
+        help="число процессов для параллельного разбора (0 - по числу ядер)"
+    )
+    arg_parser.add_argument(
+        '--no-mmap', action='store_true',
+        help="читать лог в текстовом режиме вместо разбора отображенных в память байт"
+    )
+    arg_parser.add_argument(
+        '--log-line-prefix',
+        help="log_line_prefix сервера (например, '%%m [%%p] %%u@%%d ') для разбора без перебора"
+    )
+    arg_parser.add_argument(
+        '--cache-size', type=int, default=100000,
+        help="максимум записей в кэше нормализации SQL"
+    )
+    arg_parser.add_argument(
+        '--cache-bytes', type=int,
+        help="максимальный объем кэша нормализации SQL в байтах"
+    )
+    arg_parser.add_argument(
+        '--follow', action='store_true',
+        help="следить за растущим логом (как tail -F) и обновлять минутную сводку"
+    )
+    arg_parser.add_argument(
+        '--interval', type=float, default=10,
+        help="период обновления минутной сводки в режиме --follow, секунд"
+    )
+    arg_parser.add_argument(
+        '--from-end', action='store_true',
+        help="в режиме --follow начинать с конца файла"
+    )
+    arg_parser.add_argument(
+        '--checkpoint',
+        help="файл контрольной точки: продолжить разбор с сохраненного смещения и сохранять прогресс"
+    )
+    arg_parser.add_argument(
+        '--checkpoint-every', type=int, default=64,
+        help="период сохранения контрольной точки, МБ лога"
+    )
+    arg_parser.add_argument(
+        '--sqlite',
+        help="база SQLite, в которую сохраняются отпечатки и счетчики сводок этого разбора"
+    )
+    arg_parser.add_argument(
+        '--compress-level', type=int, default=9, choices=range(1, 10), metavar='1-9',
+        help="уровень сжатия gzip для архива"
+    )
+    arg_parser.add_argument(
+        '--compress-threads', type=int, default=0,
+        help="число потоков сжатия архива (0 - по числу ядер)"
+    )
+    arg_parser.add_argument(
+        '--work-dir',
+        help="каталог для рабочих файлов запуска (например, /dev/shm); по умолчанию системный временный"
+    )
+    arg_parser.add_argument(
+        '--latency', action='store_true',
+        help="сводки задержек по строкам duration: количество, среднее, p50/p95/p99"
+    )
+    arg_parser.add_argument(
+        '--detail-cardinality', action='store_true',
+        help="оценка числа различных наборов параметров каждого отпечатка DETAIL по датам (HyperLogLog)"
+    )
+    arg_parser.add_argument(
+        '--no-detail-dumps', action='store_true',
+        help="не сохранять сырые DETAIL: Parameters в DETAIL_<дата>.log"
+    )
+    arg_parser.add_argument(
+        '--profile',
+        help="JSON-файл с временем, объемом, пропускной способностью и памятью по этапам разбора"
+    )
+    arg_parser.add_argument(
+        '--progress', action='store_true',
+        help="печатать ход разбора и оценку оставшегося времени (для несжатого лога)"
+    )
+    arg_parser.add_argument(
+        '--columnar', action='store_true',
+        help="считать сводки векторно в столбцах numpy (быстрее и компактнее на больших логах)"
+    )
+    arg_parser.add_argument(
+        '--timeseries',
+        help="сохранить поминутные ряды запросов в компактный бинарный файл (просмотр: timeseries.py)"
+    )
+    arg_parser.add_argument(
+        '--top-k', type=int,
+        help="в сводках только K самых частых запросов каждого ключа времени (с оценкой погрешности)"
+    )
+    arg_parser.add_argument(
+        '--statements-only', action='store_true',
+        help="учитывать только statement/execute и пропускать prepare (как *parser2.py)"
+    )
+    return arg_parser
+
+
+if __name__ == '__main__':
+    arg_parser = build_arg_parser()
+    args = arg_parser.parse_args()
+    if args.batch and (args.follow or args.checkpoint):
+        arg_parser.error("--batch несовместим с --follow и --checkpoint")
+    if args.top_k is not None and args.top_k < 1:
+        arg_parser.error("--top-k должен быть положительным")
+    if args.columnar:
+        if not columnar_available():
+            arg_parser.error("для --columnar нужен numpy (pip install numpy)")
+        if args.top_k or args.follow:
+            arg_parser.error("--columnar несовместим с --top-k и --follow")
+    if args.timeseries and (args.top_k or args.follow or args.columnar):
+        arg_parser.error("--timeseries несовместим с --top-k, --follow и --columnar")
+    if args.batch:
+        log_files = expand_log_files(args.log_file)
+        if not log_files:
+            arg_parser.error(f"нет файлов логов: {args.log_file}")
+    elif args.follow and not is_seekable_log(args.log_file):
+        arg_parser.error("--follow работает только с несжатым файлом лога")
+    if args.checkpoint and not is_seekable_log(args.log_file):
+        arg_parser.error("--checkpoint работает только с несжатым файлом лога")
+    parser = MultiLogParser(
+        batch_log_path(args.log_file) if args.batch else args.log_file,
+        statements_only=args.statements_only,
+        write_dumps=not args.no_dumps,
+        workers=args.workers or os.cpu_count(),
+        use_mmap=not args.no_mmap,
+        log_line_prefix=args.log_line_prefix,
+        cache_size=args.cache_size,
+        cache_bytes=args.cache_bytes,
+        checkpoint_path=args.checkpoint,
+        checkpoint_every=args.checkpoint_every * 1024 * 1024,
+        sqlite_path=args.sqlite,
+        compress_level=args.compress_level,
+        compress_threads=args.compress_threads,
+        work_root=args.work_dir,
+        latency=args.latency,
+        top_k=args.top_k,
+        detail_cardinality=args.detail_cardinality,
+        write_detail_dumps=not args.no_detail_dumps,
+        profile_path=args.profile,
+        progress=args.progress,
+        columnar=args.columnar,
+        timeseries_path=args.timeseries,
+    )
+    if args.batch:
+        if parser.parse_batch(log_files):
+            sys.exit(1)
+    elif args.follow:
+        LogFollower(parser, interval=args.interval, from_end=args.from_end).run()
+    else:
+        parser.parse()
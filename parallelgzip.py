@@ -0,0 +1,72 @@
+import os
+import gzip
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Размер блока, который сжимается независимо в отдельный gzip-член
+BLOCK_SIZE = 1024 * 1024
+
+
+class ParallelGzipWriter:
+    """Запись gzip-файла со сжатием блоков в пуле потоков.
+
+    Каждый блок сжимается отдельно в самостоятельный gzip-член (zlib
+    отпускает GIL), и члены пишутся в файл в исходном порядке. Конкатенация
+    gzip-членов - корректный gzip, который читают gzip, tar xzf и tarfile.
+    Пул потоков можно разделить между несколькими файлами (executor), а
+    функцию сжатия блока - заменить (compress, например, для профилирования).
+    """
+
+    def __init__(self, path, mode='wb', level=9, threads=None, executor=None, block_size=BLOCK_SIZE,
+                 compress=gzip.compress):
+        self.file = open(path, mode)
+        self.level = level
+        self.compress = compress
+        self.block_size = block_size
+        threads = threads or os.cpu_count()
+        self.own_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=threads)
+        # Ограничение числа блоков в очереди на сжатие, чтобы память не росла
+        self.max_pending = 2 * threads
+        self.pending = deque()
+        self.buffer = bytearray()
+        self.written = False
+
+    def write(self, data):
+        self.buffer += data
+        if len(self.buffer) >= self.block_size:
+            view = memoryview(self.buffer)
+            end = len(self.buffer) - len(self.buffer) % self.block_size
+            for start in range(0, end, self.block_size):
+                self.submit(bytes(view[start:start + self.block_size]))
+            view.release()
+            del self.buffer[:end]
+        return len(data)
+
+    def submit(self, block):
+        """Отправка блока на сжатие и запись уже сжатых блоков сверх очереди"""
+        self.pending.append(self.executor.submit(self.compress, block, self.level))
+        while len(self.pending) > self.max_pending:
+            self.file.write(self.pending.popleft().result())
+        self.written = True
+
+    def close(self):
+        if self.file.closed:
+            return
+        try:
+            # Пустой файл тоже должен быть корректным gzip
+            if self.buffer or not self.written:
+                self.submit(bytes(self.buffer))
+                self.buffer.clear()
+            while self.pending:
+                self.file.write(self.pending.popleft().result())
+        finally:
+            self.file.close()
+            if self.own_executor:
+                self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,112 @@
+import re
+
+TIMESTAMP = r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}'
+TIME_ZONE = r'(?: [A-Za-z0-9+-]+)?'
+
+# Escape-последовательности log_line_prefix: имя поля и его регулярное выражение.
+# None - произвольный текст до следующего литерала префикса
+PREFIX_ESCAPES = {
+    # Доли секунды необязательны, как в регулярных выражениях *parser2.py
+    'm': ('timestamp', TIMESTAMP + r'(?:\.\d+)?' + TIME_ZONE),
+    't': ('timestamp', TIMESTAMP + TIME_ZONE),
+    's': ('session_start', TIMESTAMP + TIME_ZONE),
+    'n': ('epoch', r'\d+\.\d+'),
+    'p': ('pid', r'\d+'),
+    'P': ('leader_pid', r'\d*'),
+    'l': ('line_number', r'\d+'),
+    'c': ('session_id', r'[0-9a-f]+\.[0-9a-f]+'),
+    'x': ('xid', r'\d+'),
+    'e': ('sqlstate', r'[0-9A-Z]{5}'),
+    'Q': ('query_id', r'-?\d+'),
+    'u': ('user', None),
+    'd': ('database', None),
+    'a': ('application', None),
+    'h': ('host', None),
+    'r': ('remote', None),
+    'b': ('backend_type', None),
+    'i': ('command_tag', None),
+    'v': ('vxid', None),
+}
+
+# Сообщение после префикса: тип определяется одним совпадением. Как в регулярных
+# выражениях *parser2.py, DETAIL проверяется первым, а регистр, пробелы и текст
+# перед statement/execute (duration, ошибка в слове) не важны
+MESSAGE_PATTERN = (
+    r'(?:'
+    r'.*?DETAIL:\s+Parameters:\s+(?P<params>.*)'
+    # Выполненный запрос (в т.ч. с duration при log_min_duration_statement)
+    # или текст запроса, завершившегося ошибкой
+    r'|.*?(?:statement|execute \S+):\s+(?P<sql>[^;]*)'
+    r'|(?P<severity>[A-Z0-9]+):  (?P<message>.*)'
+    r')?'
+)
+
+
+class LogLinePrefix:
+    """Разбор строк лога по log_line_prefix PostgreSQL (например, '%m [%p] %u@%d ').
+
+    Префикс компилируется в якорное регулярное выражение без ленивых
+    квантификаторов: поля с произвольным текстом ограничены следующим
+    литералом префикса (ленивый поиск остается только в сообщении). Совпадение сразу дает временную метку, поля префикса
+    (pid, user, database, ...) и тип сообщения.
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.field_names = []
+        body = self.compile_prefix(prefix)
+        if 'timestamp' not in self.field_names:
+            raise ValueError(f"log_line_prefix должен содержать %m или %t: {prefix!r}")
+        self.field_names.remove('timestamp')
+        self.pattern = re.compile('^' + body + MESSAGE_PATTERN, re.IGNORECASE)
+
+    def compile_prefix(self, prefix):
+        """Регулярное выражение для log_line_prefix"""
+        parts = []
+        i = 0
+        while i < len(prefix):
+            char = prefix[i]
+            if char != '%':
+                parts.append(re.escape(char))
+                i += 1
+                continue
+
+            # %[-]<ширина><буква>: ширина дополняет поле пробелами
+            j = i + 1
+            while j < len(prefix) and (prefix[j] == '-' or prefix[j].isdigit()):
+                j += 1
+            if j >= len(prefix):
+                raise ValueError(f"Незавершенная escape-последовательность в log_line_prefix: {prefix!r}")
+            padded = j > i + 1
+            escape = prefix[j]
+            i = j + 1
+
+            if escape == '%':
+                parts.append('%')
+            elif escape == 'q':
+                # Остаток префикса выводится только для клиентских сессий
+                parts.append('(?:' + self.compile_prefix(prefix[i:]) + ')?')
+                break
+            elif escape in PREFIX_ESCAPES:
+                name, field_pattern = PREFIX_ESCAPES[escape]
+                if field_pattern is None:
+                    following = prefix[i] if i < len(prefix) and prefix[i] != '%' else None
+                    field_pattern = f'[^{re.escape(following)}]*' if following else r'\S*'
+                if name in self.field_names:
+                    parts.append(f'(?:{field_pattern})')
+                else:
+                    self.field_names.append(name)
+                    parts.append(f'(?P<{name}>{field_pattern})')
+                if padded:
+                    parts[-1] = f' *{parts[-1]} *'
+            else:
+                raise ValueError(f"Неизвестная escape-последовательность %{escape} в log_line_prefix")
+        return ''.join(parts)
+
+    def match(self, line):
+        """Совпадение для строки с префиксом или None для строки-продолжения"""
+        return self.pattern.match(line)
+
+    def fields(self, match):
+        """Поля префикса, кроме временной метки (pid, user, database, ...)"""
+        return {name: match.group(name) for name in self.field_names}
@@ -0,0 +1,200 @@
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # Нет на Windows: пиковая память и процессорное время процессов пула не измеряются
+    resource = None
+
+
+def peak_rss_kb():
+    """Пиковый размер резидентной памяти процесса и завершившихся дочерних процессов, КБ"""
+    if resource is None:
+        return None
+    # На Linux ru_maxrss в КБ, на macOS - в байтах
+    scale = 1024 if sys.platform == 'darwin' else 1
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // scale
+    return max(own, children)
+
+
+def cpu_seconds():
+    """Процессорное время процесса (всех потоков) и завершившихся дочерних процессов"""
+    total = time.process_time()
+    if resource is not None:
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        total += children.ru_utime + children.ru_stime
+    return total
+
+
+class StageProfiler:
+    """Время, объем данных и пиковая память по этапам разбора.
+
+    Этап - именованный участок (stage()) или обернутая функция (wrap()),
+    время повторных входов суммируется. Вложенные этапы входят и во время
+    объемлющего. К этапу можно добавить счетчики (байты, строки, запросы),
+    по которым в отчете считается пропускная способность.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.extra = {}
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def entry(self, name):
+        """Запись этапа name (создается при первом обращении)"""
+        entry = self.stages.get(name)
+        if entry is None:
+            entry = self.stages[name] = {'calls': 0, 'wall': 0.0}
+        return entry
+
+    @contextmanager
+    def stage(self, name):
+        """Измерение участка кода как этапа name"""
+        wall = time.perf_counter()
+        cpu = cpu_seconds()
+        try:
+            yield
+        finally:
+            entry = self.entry(name)
+            entry['calls'] += 1
+            entry['wall'] += time.perf_counter() - wall
+            entry['cpu'] = entry.get('cpu', 0.0) + cpu_seconds() - cpu
+            entry['peak_rss_kb'] = peak_rss_kb()
+
+    def wrap(self, name, func, shared=False):
+        """Функция, каждый вызов которой учитывается в этапе name.
+
+        Для частых вызовов измеряется только время по часам: getrusage на
+        каждый вызов стоил бы дороже самой функции. Функции, которые
+        вызываются из нескольких потоков (shared), учитываются под
+        блокировкой, и их время суммируется по потокам.
+        """
+        entry = self.entry(name)
+        clock = time.perf_counter
+        lock = self.lock
+
+        def wrapper(*args, **kwargs):
+            started = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                entry['calls'] += 1
+                entry['wall'] += clock() - started
+
+        def shared_wrapper(*args, **kwargs):
+            started = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = clock() - started
+                with lock:
+                    entry['calls'] += 1
+                    entry['wall'] += elapsed
+        return shared_wrapper if shared else wrapper
+
+    def iterate(self, name, iterable):
+        """Элементы iterable; время получения каждого учитывается в этапе name"""
+        entry = self.entry(name)
+        clock = time.perf_counter
+        iterator = iter(iterable)
+        while True:
+            started = clock()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                entry['wall'] += clock() - started
+                return
+            entry['calls'] += 1
+            entry['wall'] += clock() - started
+            yield item
+
+    def count(self, name, **counters):
+        """Добавление счетчиков (bytes, lines, statements, ...) к этапу name"""
+        entry = self.entry(name)
+        for counter, value in counters.items():
+            if value is not None:
+                entry[counter] = entry.get(counter, 0) + value
+
+    def merge(self, stages):
+        """Добавление этапов другого профилировщика (например, процесса пула)"""
+        for name, other in stages.items():
+            entry = self.entry(name)
+            for key, value in other.items():
+                if value is None:
+                    continue
+                if key == 'peak_rss_kb':
+                    entry[key] = max(entry.get(key) or 0, value)
+                else:
+                    entry[key] = entry.get(key, 0) + value
+
+    def report(self):
+        """Отчет: этапы в порядке первого входа с производными величинами в секунду"""
+        stages = {}
+        for name, entry in self.stages.items():
+            stage = dict(entry)
+            wall = entry['wall']
+            for counter in ('bytes', 'lines', 'statements'):
+                if counter in entry and wall > 0:
+                    stage[f"{counter}_per_sec"] = entry[counter] / wall
+            stages[name] = stage
+        return {
+            'wall': time.perf_counter() - self.started,
+            'cpu': cpu_seconds(),
+            'peak_rss_kb': peak_rss_kb(),
+            'stages': stages,
+            **self.extra,
+        }
+
+    def write(self, path):
+        """Сохранение отчета в JSON"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+
+
+class TimedPattern:
+    """Скомпилированное выражение, вызовы match которого учитываются в этапе профилировщика"""
+
+    def __init__(self, pattern, profiler, name):
+        self.pattern = pattern.pattern
+        self.flags = pattern.flags
+        self.match = profiler.wrap(name, pattern.match)
+
+
+class ProgressReporter:
+    """Печать хода разбора не чаще раза в interval секунд с оценкой оставшегося времени"""
+
+    def __init__(self, total, interval=5, stream=None):
+        self.total = total
+        self.interval = interval
+        self.stream = stream or sys.stderr
+        self.started = time.monotonic()
+        self.printed = self.started
+        self.printed_offset = None
+
+    def update(self, offset, force=False):
+        """Разобрано offset байт из total"""
+        now = time.monotonic()
+        if not force and now - self.printed < self.interval:
+            return
+        self.printed = now
+        self.printed_offset = offset
+        elapsed = now - self.started
+        rate = offset / elapsed if elapsed > 0 else 0
+        message = f"Разобрано {offset / 1048576:.1f} из {self.total / 1048576:.1f} МБ"
+        if self.total:
+            message += f" ({100 * offset / self.total:.1f}%)"
+        message += f", {rate / 1048576:.1f} МБ/с"
+        if rate and offset < self.total:
+            message += f", осталось ~{(self.total - offset) / rate:.0f} с"
+        print(message, file=self.stream, flush=True)
+
+    def finish(self):
+        """Итоговая строка, если последнее обновление не было напечатано"""
+        if self.printed_offset != self.total:
+            self.update(self.total, force=True)
@@ -0,0 +1,185 @@
+import sys
+import sqlite3
+from datetime import datetime
+from itertools import groupby
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    created TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fingerprints (
+    id INTEGER PRIMARY KEY,
+    sql TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS counts (
+    run_id INTEGER NOT NULL,
+    granularity TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    fingerprint_id INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    time_key TEXT,
+    PRIMARY KEY (run_id, granularity, bucket, fingerprint_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS counts_by_fingerprint ON counts (granularity, fingerprint_id, run_id);
+CREATE INDEX IF NOT EXISTS fingerprints_by_sql ON fingerprints (sql);
+CREATE TABLE IF NOT EXISTS detail_counts (
+    run_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    fingerprint_id INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (run_id, date, fingerprint_id)
+) WITHOUT ROWID;
+"""
+
+# Ключ времени для сравнения, как у summary_comparer.extract_time_key
+TIME_KEYS = {
+    'minute': "substr(bucket, 12, 5)",
+    'hour': "substr(bucket, 12, 2) || ':00'",
+    'day': "'daily'",
+}
+
+# Индекс для compare_runs: для каждого отпечатка строки идут по ключу времени
+# и запуску, поэтому запрос обходит отпечатки по fingerprints_by_sql и не сортирует
+COMPARE_INDEX = """
+CREATE INDEX IF NOT EXISTS counts_by_time_key
+ON counts (granularity, fingerprint_id, time_key, run_id, bucket, count)
+"""
+
+
+def time_key(granularity, bucket):
+    """Ключ сравнения для ключа времени сводки, как у summary_comparer.extract_time_key"""
+    if granularity == 'minute':
+        return bucket[11:16]
+    if granularity == 'hour':
+        return bucket[11:13] + ":00"
+    if granularity == 'day':
+        return "daily"
+    return ""
+
+
+def to_signed(fingerprint):
+    """64-битный беззнаковый отпечаток в знаковое INTEGER SQLite"""
+    return fingerprint - (1 << 64) if fingerprint >= (1 << 63) else fingerprint
+
+
+class ResultStore:
+    """Результаты разборов в SQLite: отпечатки, счетчики по ключам времени и DETAIL"""
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+        self.upgrade()
+
+    def upgrade(self):
+        """Столбец time_key и индекс сравнения для баз, созданных до их появления"""
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(counts)")]
+        with self.connection:
+            if 'time_key' not in columns:
+                self.connection.execute("ALTER TABLE counts ADD COLUMN time_key TEXT")
+            for granularity, expression in TIME_KEYS.items():
+                self.connection.execute(
+                    f"UPDATE counts SET time_key = {expression} WHERE granularity = ? AND time_key IS NULL",
+                    (granularity,),
+                )
+            self.connection.execute(COMPARE_INDEX)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def store_run(self, source, fingerprints, stats, detail_counts):
+        """Сохранение результатов одного разбора; возвращает идентификатор запуска.
+
+        fingerprints - отпечаток -> нормализованный текст, stats - гранулярность ->
+        ключ времени -> отпечаток -> количество, detail_counts - дата -> отпечаток -> количество.
+        """
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO runs (source, created) VALUES (?, ?)",
+                (source, datetime.now().isoformat(timespec='seconds')),
+            )
+            run_id = cursor.lastrowid
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO fingerprints (id, sql) VALUES (?, ?)",
+                ((to_signed(fingerprint), sql) for fingerprint, sql in fingerprints.items()),
+            )
+            self.connection.executemany(
+                "INSERT INTO counts (run_id, granularity, bucket, fingerprint_id, count, time_key) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (run_id, granularity, bucket, to_signed(fingerprint), count, time_key(granularity, bucket))
+                    for granularity, buckets in stats.items()
+                    for bucket, counts in buckets.items()
+                    for fingerprint, count in counts.items()
+                ),
+            )
+            self.connection.executemany(
+                "INSERT INTO detail_counts (run_id, date, fingerprint_id, count) VALUES (?, ?, ?, ?)",
+                (
+                    (run_id, date, to_signed(fingerprint), count)
+                    for date, counts in detail_counts.items()
+                    for fingerprint, count in counts.items()
+                ),
+            )
+        return run_id
+
+    def runs(self):
+        """Список запусков (id, источник, время)"""
+        return self.connection.execute("SELECT id, source, created FROM runs ORDER BY id").fetchall()
+
+    def compare_runs(self, run_ids, granularity):
+        """Сравнение запусков: (sql, ключ времени, [(время, количество) по запускам]).
+
+        Строки идут в порядке (sql, ключ времени). Если у запуска несколько
+        ключей времени с одним ключом сравнения (разные даты), берется
+        последний, как при построчном чтении сводки в summary_comparer.
+        Порядок дает индекс counts_by_time_key, временной сортировки нет.
+        """
+        if granularity not in TIME_KEYS:
+            raise ValueError(f"Неизвестная гранулярность: {granularity}")
+        if not run_ids:
+            raise ValueError("Не заданы запуски для сравнения")
+        placeholders = ', '.join('?' * len(run_ids))
+        known = {
+            row[0] for row in self.connection.execute(
+                f"SELECT id FROM runs WHERE id IN ({placeholders})", tuple(run_ids)
+            )
+        }
+        unknown = [run_id for run_id in run_ids if run_id not in known]
+        if unknown:
+            raise ValueError(f"Неизвестные запуски: {', '.join(map(str, unknown))}")
+        positions = {run_id: index for index, run_id in enumerate(run_ids)}
+        rows = self.connection.execute(
+            f"""
+            SELECT f.sql, c.time_key, c.run_id, c.bucket, c.count
+            FROM fingerprints f INDEXED BY fingerprints_by_sql
+            JOIN counts c INDEXED BY counts_by_time_key
+                ON c.granularity = ? AND c.fingerprint_id = f.id
+            WHERE c.run_id IN ({placeholders})
+            ORDER BY f.sql, f.id, c.time_key, c.run_id, c.bucket
+            """,
+            (granularity, *run_ids),
+        )
+        for (sql, time_key), group in groupby(rows, key=lambda row: (row[0], row[1])):
+            file_data = [("", 0)] * len(run_ids)
+            for _, _, run_id, bucket, count in group:
+                file_data[positions[run_id]] = (bucket, count)
+            yield sql, time_key, file_data
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print("Использование: python resultstore.py <база.db>")
+        sys.exit(1)
+
+    with ResultStore(sys.argv[1]) as store:
+        for run_id, source, created in store.runs():
+            print(f"{run_id} | {source} | {created}")
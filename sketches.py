@@ -0,0 +1,271 @@
+import math
+import base64
+import hashlib
+
+# Значения не больше этого попадают в нулевую корзину
+MIN_VALUE = 1e-9
+
+
+class LatencySketch:
+    """Гистограмма с логарифмическими корзинами (как DDSketch) для квантилей задержек.
+
+    Значение x попадает в корзину ceil(log(x) / log(gamma)), gamma = (1 + a) / (1 - a),
+    поэтому оценка любого квантиля отличается от точного значения не более
+    чем на долю a. Сами значения не хранятся, а число корзин ограничено
+    max_buckets (при превышении сливаются самые нижние). Скетчи с одинаковой
+    точностью складываются merge() без потерь.
+    """
+
+    def __init__(self, relative_accuracy=0.01, max_buckets=2048):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.max_buckets = max_buckets
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+        self.total = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        """Учет одного значения"""
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if value <= MIN_VALUE:
+            self.zero_count += 1
+            return
+        index = math.ceil(math.log(value) / self.log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        if len(self.buckets) > self.max_buckets:
+            self.collapse()
+
+    def collapse(self):
+        """Слияние самых нижних корзин до max_buckets"""
+        indices = sorted(self.buckets)
+        excess = len(indices) - self.max_buckets
+        target = indices[excess]
+        for index in indices[:excess]:
+            self.buckets[target] += self.buckets.pop(index)
+
+    def merge(self, other):
+        """Добавление другого скетча с той же точностью"""
+        if other.gamma != self.gamma:
+            raise ValueError("Скетчи с разной точностью не складываются")
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if len(self.buckets) > self.max_buckets:
+            self.collapse()
+
+    def quantile(self, q):
+        """Оценка квантиля q (0..1); None для пустого скетча"""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        running = self.zero_count
+        if rank < running:
+            return max(self.min, 0.0)
+        for index in sorted(self.buckets):
+            running += self.buckets[index]
+            if running > rank:
+                # Середина корзины (gamma^(i-1), gamma^i] в смысле относительной ошибки
+                value = 2 * self.gamma ** index / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def to_state(self):
+        """Состояние в JSON-совместимом виде (для передачи между процессами и контрольных точек)"""
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'max_buckets': self.max_buckets,
+            'buckets': list(self.buckets.items()),
+            'zero_count': self.zero_count,
+            'count': self.count,
+            'total': self.total,
+            'min': self.min,
+            'max': self.max,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        """Скетч из состояния to_state()"""
+        sketch = cls(state['relative_accuracy'], state['max_buckets'])
+        sketch.buckets = {int(index): count for index, count in state['buckets']}
+        sketch.zero_count = state['zero_count']
+        sketch.count = state['count']
+        sketch.total = state['total']
+        sketch.min = state['min']
+        sketch.max = state['max']
+        return sketch
+
+
+def rank(entry):
+    """Порядок счетчиков SpaceSaving: по убыванию count, при равенстве - по элементу"""
+    item, (count, _) = entry
+    return -count, item
+
+
+class SpaceSaving:
+    """Частые элементы потока (Space-Saving) в capacity счетчиках.
+
+    Для каждого отслеживаемого элемента хранится count - верхняя оценка
+    числа появлений - и error: истинное число лежит в [count - error, count],
+    а error не больше total / capacity. Любой элемент, встретившийся больше
+    total / capacity раз, гарантированно отслеживается. Сводки складываются
+    merge() с теми же гарантиями.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        # Элемент -> [count, error]
+        self.counters = {}
+        # count -> элементы с таким count; min_count - наименьший count среди них
+        self.by_count = {}
+        self.min_count = 0
+        self.total = 0
+
+    def add(self, item):
+        """Учет одного появления элемента"""
+        self.total += 1
+        counter = self.counters.get(item)
+        if counter is not None:
+            self.move(item, counter[0], counter[0] + 1)
+            counter[0] += 1
+            return
+        if len(self.counters) < self.capacity:
+            self.counters[item] = [1, 0]
+            self.by_count.setdefault(1, set()).add(item)
+            self.min_count = 1
+            return
+        # Вытеснение элемента с наименьшим count: новый наследует его count как погрешность
+        evicted = next(iter(self.by_count[self.min_count]))
+        count = self.min_count
+        del self.counters[evicted]
+        self.by_count[count].discard(evicted)
+        self.counters[item] = [count + 1, count]
+        self.by_count.setdefault(count + 1, set()).add(item)
+        if not self.by_count[count]:
+            del self.by_count[count]
+            self.min_count = count + 1
+
+    def move(self, item, old_count, new_count):
+        """Перенос элемента между группами by_count при увеличении count на 1"""
+        group = self.by_count[old_count]
+        group.discard(item)
+        self.by_count.setdefault(new_count, set()).add(item)
+        if not group:
+            del self.by_count[old_count]
+            if old_count == self.min_count:
+                self.min_count = new_count
+
+    def merge(self, other):
+        """Слияние с другой сводкой: недостающий элемент оценивается минимумом ее счетчиков"""
+        own_floor = self.min_count if len(self.counters) >= self.capacity else 0
+        other_floor = other.min_count if len(other.counters) >= other.capacity else 0
+        merged = {}
+        for item in self.counters.keys() | other.counters.keys():
+            own = self.counters.get(item, [own_floor, own_floor])
+            theirs = other.counters.get(item, [other_floor, other_floor])
+            merged[item] = [own[0] + theirs[0], own[1] + theirs[1]]
+        self.total += other.total
+        self.rebuild(merged)
+
+    def rebuild(self, counters):
+        """Счетчики из словаря с сохранением capacity наибольших"""
+        if len(counters) > self.capacity:
+            kept = sorted(counters.items(), key=rank)[:self.capacity]
+            counters = dict(kept)
+        self.counters = counters
+        self.by_count = {}
+        for item, (count, _) in counters.items():
+            self.by_count.setdefault(count, set()).add(item)
+        self.min_count = min(self.by_count) if self.by_count else 0
+
+    def top(self, k):
+        """k элементов с наибольшим count: (элемент, count, error)"""
+        ranked = sorted(self.counters.items(), key=rank)[:k]
+        return [(item, count, error) for item, (count, error) in ranked]
+
+    def to_state(self):
+        """Состояние в JSON-совместимом виде"""
+        return {
+            'capacity': self.capacity,
+            'total': self.total,
+            'counters': [[item, count, error] for item, (count, error) in self.counters.items()],
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        """Сводка из состояния to_state()"""
+        summary = cls(state['capacity'])
+        summary.total = state['total']
+        summary.rebuild({item: [count, error] for item, count, error in state['counters']})
+        return summary
+
+
+class DistinctSketch:
+    """Оценка числа различных значений (HyperLogLog) в 2^precision однобайтовых регистрах.
+
+    Значение хешируется в 64 бита: старшие precision бит выбирают регистр,
+    в котором хранится наибольшая позиция первой единицы остальных бит.
+    Стандартная ошибка оценки 1.04 / sqrt(2^precision) - около 2% для
+    precision=11 (2 КБ). Сводки с одинаковой точностью складываются merge()
+    без потерь.
+    """
+
+    def __init__(self, precision=11):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, value):
+        """Учет строкового значения"""
+        digest = hashlib.blake2b(value.encode('utf-8', errors='surrogatepass'), digest_size=8).digest()
+        hashed = int.from_bytes(digest, 'big')
+        width = 64 - self.precision
+        index = hashed >> width
+        rank = width - (hashed & ((1 << width) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        """Объединение с другой сводкой той же точности"""
+        if other.precision != self.precision:
+            raise ValueError("Сводки HyperLogLog с разной точностью не складываются")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def estimate(self):
+        """Оценка числа различных значений"""
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        # На малых количествах точнее линейный подсчет по пустым регистрам
+        if raw <= 2.5 * m and zeros:
+            return m * math.log(m / zeros)
+        return raw
+
+    def to_state(self):
+        """Состояние в JSON-совместимом виде"""
+        return {
+            'precision': self.precision,
+            'registers': base64.b64encode(self.registers).decode('ascii'),
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        """Сводка из состояния to_state()"""
+        sketch = cls(state['precision'])
+        sketch.registers = bytearray(base64.b64decode(state['registers']))
+        return sketch
@@ -1,6 +1,31 @@
+import os
 import sys
 import re
-from collections import defaultdict
+import heapq
+from itertools import groupby
+from operator import itemgetter
+
+from extsort import DEFAULT_MEMORY_LIMIT, ExternalSorter
+from resultstore import ResultStore
+
+# Режимы чтения сводки: строки выдаются как есть; строки ключа времени
+# собираются и сортируются; сводка сортируется целиком
+STREAM = 'stream'
+GROUP = 'group'
+SORT = 'sort'
+
+# Маркер в потоке process_files: слияние начато заново, выданное ранее отбрасывается
+RESTART = object()
+
+
+class RowsOutOfOrder(Exception):
+    """Строки сводки нельзя выдать по порядку в текущем режиме чтения"""
+
+    def __init__(self, file_index, mode):
+        super().__init__(file_index, mode)
+        self.file_index = file_index
+        self.mode = mode
+
 
 def determine_file_type(timestamp_str):
     """Определяет тип файла по формату временной метки"""
@@ -22,10 +47,114 @@ def extract_time_key(timestamp_str, file_type):
         return "daily"
     return ""
 
+def parse_summary_lines(file_path, file_type):
+    """Разобранные строки сводки: (ключ времени, запрос, метка, количество)"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+
+            parts = line.split(' | ', 2)
+            if len(parts) < 3:
+                continue
+
+            timestamp_str = parts[0]
+            sql = parts[1]
+
+            # Извлекаем количество выполнений
+            count_part = parts[2]
+            try:
+                count = int(count_part.split()[-2])  # Предпоследнее слово в последней части
+            except (ValueError, IndexError):
+                continue
+
+            yield extract_time_key(timestamp_str, file_type), sql, timestamp_str, count
+
+def read_summary_rows(file_path, file_index, file_type, mode=STREAM, memory_limit=DEFAULT_MEMORY_LIMIT):
+    """Строки сводки в порядке (ключ времени, запрос): (ключ времени, запрос, индекс файла, метка, количество).
+
+    Сводка отсортирована по метке времени, а внутри метки - по запросу. В
+    режиме STREAM у каждого ключа времени одна метка, и строки выдаются сразу
+    по мере чтения. Если у ключа появляется вторая метка (минуты одного часа,
+    дни дневной сводки) или запросы идут не по возрастанию, выбрасывается
+    RowsOutOfOrder с режимом GROUP: тогда строки каждого ключа собираются
+    (с выгрузкой на диск) и выдаются отсортированными, при повторе запроса
+    остается последняя строка. Если ключ времени убывает (сводка за
+    несколько дней), выбрасывается RowsOutOfOrder с режимом SORT, и сводка
+    сортируется целиком.
+    """
+    if mode == SORT:
+        yield from read_unordered_rows(file_path, file_index, file_type, memory_limit)
+        return
+
+    group_key = None
+    group_timestamp = None
+    previous_sql = None
+    sorter = None
+    try:
+        for seq, (time_key, sql, timestamp_str, count) in enumerate(parse_summary_lines(file_path, file_type)):
+            if time_key != group_key:
+                if group_key is not None and time_key < group_key:
+                    raise RowsOutOfOrder(file_index, SORT)
+                if sorter is not None:
+                    yield from sorted_group(sorter, group_key, file_index)
+                    sorter.close()
+                    sorter = None
+                group_key = time_key
+                group_timestamp = timestamp_str
+                previous_sql = None
+                if mode == GROUP:
+                    sorter = ExternalSorter(memory_limit)
+
+            if sorter is not None:
+                sorter.add((sql, seq, timestamp_str, count), len(sql) + len(timestamp_str))
+                continue
+            if timestamp_str != group_timestamp or (previous_sql is not None and sql <= previous_sql):
+                raise RowsOutOfOrder(file_index, GROUP)
+            previous_sql = sql
+            yield time_key, sql, file_index, timestamp_str, count
+
+        if sorter is not None:
+            yield from sorted_group(sorter, group_key, file_index)
+    finally:
+        if sorter is not None:
+            sorter.close()
+
+def sorted_group(sorter, time_key, file_index):
+    """Строки одного ключа времени по запросу; из повторов запроса остается последняя"""
+    for sql, group in groupby(sorter.sorted_rows(), key=itemgetter(0)):
+        for row in group:
+            pass
+        yield (time_key, sql, file_index) + row[2:]
+
+def read_unordered_rows(file_path, file_index, file_type, memory_limit=DEFAULT_MEMORY_LIMIT):
+    """Строки сводки с невозрастающими ключами времени в порядке (ключ времени, запрос).
+
+    Строки сортируются по (ключ времени, запрос, номер строки) порциями до
+    memory_limit байт с выгрузкой во временные файлы (extsort.ExternalSorter);
+    из повторов пары (запрос, ключ времени) остается последняя строка, как при
+    перезаписи в словаре.
+    """
+    with ExternalSorter(memory_limit) as sorter:
+        for seq, (time_key, sql, timestamp_str, count) in enumerate(parse_summary_lines(file_path, file_type)):
+            sorter.add((time_key, sql, seq, timestamp_str, count), len(sql) + len(timestamp_str))
+
+        for (time_key, sql), group in groupby(sorter.sorted_rows(), key=itemgetter(0, 1)):
+            for row in group:
+                pass
+            yield (time_key, sql, file_index) + row[3:]
+
 def process_files(file_paths):
-    """Обрабатывает файлы и возвращает объединенные данные"""
-    # Словарь для хранения результатов: (query, time_key) -> {file_index: (timestamp, count)}
-    combined_data = defaultdict(lambda: [("", 0)] * len(file_paths))
+    """Объединяет файлы слиянием отсортированных потоков строк.
+
+    Возвращает генератор ((запрос, ключ времени), [(метка, количество) по файлам])
+    в порядке (ключ времени, запрос); память ограничена числом файлов, а не
+    числом различных запросов. Сводки читаются один раз без предварительного
+    прохода; если сводка оказывается неупорядоченной, для нее выбирается
+    режим чтения из RowsOutOfOrder, генератор выдает RESTART и слияние
+    начинается заново.
+    """
     file_types = []
     
     # Определяем типы файлов
@@ -41,72 +170,95 @@ def process_files(file_paths):
                 file_types.append("unknown")
             else:
                 file_types.append(determine_file_type(parts[0]))
-    
-    # Обрабатываем каждый файл
-    for file_index, file_path in enumerate(file_paths):
-        with open(file_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                    
-                parts = line.split(' | ', 2)
-                if len(parts) < 3:
-                    continue
-                    
-                timestamp_str = parts[0]
-                sql = parts[1]
-                
-                # Извлекаем количество выполнений
-                count_part = parts[2]
-                try:
-                    count = int(count_part.split()[-2])  # Предпоследнее слово в последней части
-                except (ValueError, IndexError):
+
+    def merge_rows():
+        modes = [STREAM] * len(file_paths)
+        while True:
+            streams = [
+                read_summary_rows(file_path, file_index, file_types[file_index], modes[file_index])
+                for file_index, file_path in enumerate(file_paths)
+            ]
+            try:
+                rows = heapq.merge(*streams)
+                for (time_key, sql), group in groupby(rows, key=itemgetter(0, 1)):
+                    file_data = [("", 0)] * len(file_paths)
+                    for _, _, file_index, timestamp_str, count in group:
+                        file_data[file_index] = (timestamp_str, count)
+                    yield (sql, time_key), file_data
+                return
+            except RowsOutOfOrder as error:
+                modes[error.file_index] = error.mode
+            finally:
+                for stream in streams:
+                    stream.close()
+            yield RESTART
+
+    return merge_rows(), file_paths
+
+def process_store(db_path, run_ids, granularity):
+    """Объединение запусков из базы SQLite индексированным запросом вместо чтения сводок"""
+    with ResultStore(db_path) as store:
+        for sql, time_key, file_data in store.compare_runs(run_ids, granularity):
+            yield (sql, time_key), file_data
+
+def save_combined_results(rows, file_paths, output_file="combined_results.log"):
+    """Сохраняет объединенные результаты в файл по мере их получения.
+
+    Строки пишутся во временный файл, который заменяет output_file только
+    после успешного слияния: ошибка не оставляет обрезанный результат. После
+    RESTART временный файл переписывается с начала.
+    """
+    temp_file = f"{output_file}.tmp"
+    try:
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            # Заголовок с именами файлов
+            header = " | ".join([f"TimeStamp_{i+1}" for i in range(len(file_paths))])
+            header += " | SQL_Query | " + " | ".join([f"Count_{i+1}" for i in range(len(file_paths))])
+            f.write(header + "\n")
+
+            # Данные
+            for row in rows:
+                if row is RESTART:
+                    f.seek(0)
+                    f.truncate()
+                    f.write(header + "\n")
                     continue
-                
-                # Получаем тип файла и ключ времени
-                file_type = file_types[file_index]
-                time_key = extract_time_key(timestamp_str, file_type)
-                
-                # Обновляем данные
-                key = (sql, time_key)
-                current_data = list(combined_data[key])
-                current_data[file_index] = (timestamp_str, count)
-                combined_data[key] = current_data
-                
-    return combined_data, file_paths
-
-def save_combined_results(data, file_paths, output_file="combined_results.log"):
-    """Сохраняет объединенные результаты в файл"""
-    with open(output_file, 'w', encoding='utf-8') as f:
-        # Заголовок с именами файлов
-        header = " | ".join([f"TimeStamp_{i+1}" for i in range(len(file_paths))])
-        header += " | SQL_Query | " + " | ".join([f"Count_{i+1}" for i in range(len(file_paths))])
-        f.write(header + "\n")
-        
-        # Данные
-        for (sql, time_key), file_data in data.items():
-            timestamps = []
-            counts = []
-            
-            for timestamp, count in file_data:
-                timestamps.append(timestamp)
-                counts.append(str(count))
-            
-            timestamp_line = " | ".join(timestamps)
-            count_line = " | ".join(counts)
-            f.write(f"{timestamp_line} | {sql} | {count_line}\n")
+                (sql, time_key), file_data = row
+                timestamps = []
+                counts = []
+
+                for timestamp, count in file_data:
+                    timestamps.append(timestamp)
+                    counts.append(str(count))
+
+                timestamp_line = " | ".join(timestamps)
+                count_line = " | ".join(counts)
+                f.write(f"{timestamp_line} | {sql} | {count_line}\n")
+    except BaseException:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+    os.replace(temp_file, output_file)
 
 def main():
-    if len(sys.argv) < 2 or len(sys.argv) > 8:
-        print("Использование: python combiner.py file1 [file2 ... file7]")
-        print("Максимальное количество файлов: 7")
+    if len(sys.argv) > 1 and sys.argv[1] == '--db':
+        if len(sys.argv) < 5:
+            print("Использование: python summary_comparer.py --db база.db minute|hour|day run_id1 [run_id2 ...]")
+            return
+        run_ids = [int(run_id) for run_id in sys.argv[4:]]
+        combined_data = process_store(sys.argv[2], run_ids, sys.argv[3])
+        save_combined_results(combined_data, run_ids)
+        print("Результаты объединены в файл: combined_results.log")
+        return
+
+    if len(sys.argv) < 2:
+        print("Использование: python summary_comparer.py file1 [file2 ...]")
         return
 
     file_paths = sys.argv[1:]
     combined_data, processed_files = process_files(file_paths)
     save_combined_results(combined_data, processed_files)
-    print(f"Результаты объединены в файл: combined_results.log")
+    print("Результаты объединены в файл: combined_results.log")
 
 if __name__ == "__main__":
     main()
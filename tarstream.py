@@ -0,0 +1,43 @@
+import gzip
+import time
+import shutil
+import tarfile
+
+NUL = b'\0'
+
+
+def tar_header(name, size, mtime):
+    """Заголовок tar для обычного файла с правами 0644"""
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = mtime
+    info.mode = 0o644
+    return info.tobuf(tarfile.DEFAULT_FORMAT, 'utf-8', 'surrogateescape')
+
+
+def write_archive(archive_name, members, compresslevel=9):
+    """Сборка .tar.gz из уже сжатых gzip-файлов без распаковки.
+
+    members - (имя в архиве, путь к gzip-файлу с содержимым, несжатый размер).
+    Архив состоит из gzip-членов: сжатые заголовок и выравнивание tar
+    чередуются с побайтно скопированными файлами. Распаковка конкатенации
+    gzip-членов дает конкатенацию данных, то есть обычный tar.
+    """
+    mtime = int(time.time())
+    offset = 0
+    padding = b''
+    with open(archive_name, 'wb') as out:
+        for arcname, path, size in members:
+            header = tar_header(arcname, size, mtime)
+            out.write(gzip.compress(padding + header, compresslevel))
+            if size:
+                with open(path, 'rb') as src:
+                    shutil.copyfileobj(src, out, 1024 * 1024)
+            padding = NUL * (-size % tarfile.BLOCKSIZE)
+            offset += len(header) + size + len(padding)
+
+        # Два нулевых блока конца архива и дополнение до размера записи, как у tarfile
+        offset += 2 * tarfile.BLOCKSIZE
+        end = NUL * (2 * tarfile.BLOCKSIZE + (-offset % tarfile.RECORDSIZE))
+        out.write(gzip.compress(padding + end, compresslevel))
+
@@ -0,0 +1,251 @@
+import sys
+import base64
+import struct
+import argparse
+from array import array
+
+MINUTES_PER_DAY = 1440
+# Ряды с большим числом непустых минут хранятся плотным массивом счетчиков
+SPARSE_LIMIT = 64
+
+# Бинарный файл рядов (все числа little-endian):
+#   заголовок MAGIC, число отпечатков N (I), N x [отпечаток (Q), длина (I), текст UTF-8],
+#   число рядов M (I), M x [длина дня (B), день ASCII, отпечаток (Q), вид (B), данные]:
+#     DENSE  - 1440 счетчиков (I),
+#     SPARSE - число отрезков (H), отрезки [первая минута (H), длина (H), счетчики (I) x длина]
+MAGIC = b'OMPTS\x00\x01\x00'
+DENSE = 0
+SPARSE = 1
+
+
+def dense_counts(series):
+    """Ряд в виде плотного массива 1440 счетчиков"""
+    if isinstance(series, array):
+        return series
+    counts = array('I', bytes(4 * MINUTES_PER_DAY))
+    for minute, count in series.items():
+        counts[minute] = count
+    return counts
+
+
+def runs(series):
+    """Отрезки подряд идущих непустых минут разреженного ряда: (первая минута, счетчики)"""
+    result = []
+    for minute in sorted(series):
+        if result and result[-1][0] + len(result[-1][1]) == minute:
+            result[-1][1].append(series[minute])
+        else:
+            result.append((minute, [series[minute]]))
+    return result
+
+
+class MinuteSeries:
+    """Поминутные ряды счетчиков: день -> отпечаток запроса -> ряд за сутки.
+
+    Редкий запрос хранится разреженно (минута дня -> количество), а после
+    SPARSE_LIMIT непустых минут - массивом 1440 беззнаковых счетчиков
+    (5.6 КБ). Ключи минутной сводки не хранятся: они восстанавливаются из
+    дня и номера минуты. Ряды складываются merge() и сохраняются в
+    компактный бинарный файл (write/load).
+    """
+
+    def __init__(self):
+        self.days = {}
+        # Ключ минуты 'ГГГГ-ММ-ДД ЧЧ:ММ' -> (ряды дня, номер минуты в сутках)
+        self.slots = {}
+
+    def slot(self, minute_key):
+        """Ряды дня и номер минуты для ключа минутной сводки"""
+        slot = self.slots.get(minute_key)
+        if slot is None:
+            day, time = minute_key.rsplit(' ', 1)
+            slot = self.slots[minute_key] = (self.days.setdefault(day, {}), int(time[:2]) * 60 + int(time[3:]))
+        return slot
+
+    def add(self, minute_key, fingerprint, count=1):
+        """Учет count выполнений запроса в минуте minute_key"""
+        day_series, minute = self.slot(minute_key)
+        series = day_series.get(fingerprint)
+        if series is None:
+            day_series[fingerprint] = {minute: count}
+        elif type(series) is dict:
+            series[minute] = series.get(minute, 0) + count
+            if len(series) > SPARSE_LIMIT:
+                day_series[fingerprint] = dense_counts(series)
+        else:
+            series[minute] += count
+
+    def merge(self, other):
+        """Добавление рядов другого набора"""
+        for day, day_series in other.days.items():
+            for fingerprint, series in day_series.items():
+                self.merge_series(day, fingerprint, series)
+
+    def merge_series(self, day, fingerprint, series):
+        """Добавление одного ряда (разреженного или плотного)"""
+        day_series = self.days.setdefault(day, {})
+        own = day_series.get(fingerprint)
+        if own is None:
+            day_series[fingerprint] = array('I', series) if isinstance(series, array) else dict(series)
+            return
+        if type(own) is dict and type(series) is dict and len(own.keys() | series.keys()) <= SPARSE_LIMIT:
+            for minute, count in series.items():
+                own[minute] = own.get(minute, 0) + count
+            return
+        own = day_series[fingerprint] = dense_counts(own)
+        for minute, count in (series.items() if type(series) is dict else enumerate(series)):
+            own[minute] += count
+
+    def series(self, day, fingerprint):
+        """Ряд запроса за день: список 1440 счетчиков (нули, если запроса не было)"""
+        series = self.days.get(day, {}).get(fingerprint)
+        if series is None:
+            return [0] * MINUTES_PER_DAY
+        return dense_counts(series).tolist()
+
+    def minute_buckets(self):
+        """Пары (ключ минуты, отпечаток -> количество) в порядке ключей, как у минутной сводки"""
+        for day in sorted(self.days):
+            minutes = {}
+            for fingerprint, series in self.days[day].items():
+                items = series.items() if type(series) is dict else enumerate(series)
+                for minute, count in items:
+                    if count:
+                        minutes.setdefault(minute, {})[fingerprint] = count
+            for minute in sorted(minutes):
+                yield f"{day} {minute // 60:02d}:{minute % 60:02d}", minutes[minute]
+
+    def to_state(self):
+        """Состояние в JSON-совместимом виде: плотные ряды - base64, разреженные - пары"""
+        return [
+            [day, fingerprint, base64.b64encode(series.tobytes()).decode('ascii')
+             if isinstance(series, array) else list(series.items())]
+            for day, day_series in self.days.items()
+            for fingerprint, series in day_series.items()
+        ]
+
+    def merge_state(self, state):
+        """Добавление рядов из состояния to_state()"""
+        for day, fingerprint, data in state:
+            if isinstance(data, str):
+                series = array('I')
+                series.frombytes(base64.b64decode(data))
+            else:
+                series = {int(minute): count for minute, count in data}
+            self.merge_series(day, fingerprint, series)
+
+    def write(self, path, texts):
+        """Сохранение рядов и текстов их отпечатков в бинарный файл"""
+        fingerprints = sorted({fingerprint for day_series in self.days.values() for fingerprint in day_series})
+        with open(path, 'wb') as f:
+            f.write(MAGIC)
+            f.write(struct.pack('<I', len(fingerprints)))
+            for fingerprint in fingerprints:
+                text = texts[fingerprint].encode('utf-8', errors='surrogatepass')
+                f.write(struct.pack('<QI', fingerprint, len(text)))
+                f.write(text)
+
+            f.write(struct.pack('<I', sum(len(day_series) for day_series in self.days.values())))
+            for day in sorted(self.days):
+                day_bytes = day.encode('ascii')
+                for fingerprint, series in sorted(self.days[day].items()):
+                    f.write(struct.pack('<B', len(day_bytes)) + day_bytes + struct.pack('<Q', fingerprint))
+                    if isinstance(series, array):
+                        f.write(struct.pack('<B', DENSE))
+                        f.write(struct.pack(f'<{MINUTES_PER_DAY}I', *series))
+                        continue
+                    series_runs = runs(series)
+                    f.write(struct.pack('<BH', SPARSE, len(series_runs)))
+                    for first, counts in series_runs:
+                        f.write(struct.pack(f'<HH{len(counts)}I', first, len(counts), *counts))
+
+    @classmethod
+    def load(cls, path):
+        """Ряды и тексты отпечатков из файла write(): (MinuteSeries, отпечаток -> текст)"""
+        with open(path, 'rb') as f:
+            data = f.read()
+        if not data.startswith(MAGIC):
+            raise ValueError(f"{path} не является файлом поминутных рядов")
+        offset = len(MAGIC)
+
+        def unpack(fmt):
+            nonlocal offset
+            values = struct.unpack_from(fmt, data, offset)
+            offset += struct.calcsize(fmt)
+            return values
+
+        texts = {}
+        for _ in range(unpack('<I')[0]):
+            fingerprint, length = unpack('<QI')
+            texts[fingerprint] = data[offset:offset + length].decode('utf-8', errors='surrogatepass')
+            offset += length
+
+        store = cls()
+        for _ in range(unpack('<I')[0]):
+            length, = unpack('<B')
+            day = data[offset:offset + length].decode('ascii')
+            offset += length
+            fingerprint, kind = unpack('<QB')
+            if kind == DENSE:
+                series = array('I', unpack(f'<{MINUTES_PER_DAY}I'))
+            else:
+                series = {}
+                for _ in range(unpack('<H')[0]):
+                    first, count = unpack('<HH')
+                    for minute, value in enumerate(unpack(f'<{count}I'), first):
+                        series[minute] = value
+            store.days.setdefault(day, {})[fingerprint] = series
+        return store, texts
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Просмотр и сравнение файлов поминутных рядов")
+    arg_parser.add_argument('file', help="файл рядов (multiparser.py --timeseries)")
+    arg_parser.add_argument('--day', help="только этот день (ГГГГ-ММ-ДД)")
+    arg_parser.add_argument('--top', type=int, default=10, help="число самых частых запросов дня")
+    arg_parser.add_argument('--csv', help="выгрузить ряды в CSV (день,минута,запрос,количество) для графиков")
+    arg_parser.add_argument('--compare', help="второй файл рядов: разница суточных количеств запросов")
+    args = arg_parser.parse_args()
+
+    store, texts = MinuteSeries.load(args.file)
+    days = [args.day] if args.day else sorted(store.days)
+
+    if args.csv:
+        import csv
+        with open(args.csv, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['day', 'minute', 'sql', 'count'])
+            for day in days:
+                for fingerprint in sorted(store.days.get(day, {})):
+                    for minute, count in enumerate(store.series(day, fingerprint)):
+                        if count:
+                            writer.writerow([day, f"{minute // 60:02d}:{minute % 60:02d}", texts[fingerprint], count])
+        print(f"Ряды выгружены в {args.csv}")
+        return 0
+
+    if args.compare:
+        other, other_texts = MinuteSeries.load(args.compare)
+        texts = {**other_texts, **texts}
+        for day in days:
+            fingerprints = set(store.days.get(day, {})) | set(other.days.get(day, {}))
+            totals = [
+                (sum(store.series(day, fingerprint)), sum(other.series(day, fingerprint)), texts[fingerprint])
+                for fingerprint in fingerprints
+            ]
+            for first, second, sql in sorted(totals, key=lambda total: -abs(total[1] - total[0]))[:args.top]:
+                print(f"{day} | {sql} | {first} -> {second} ({second - first:+d})")
+        return 0
+
+    for day in days:
+        totals = []
+        for fingerprint in store.days.get(day, {}):
+            counts = store.series(day, fingerprint)
+            peak = max(range(MINUTES_PER_DAY), key=counts.__getitem__)
+            totals.append((sum(counts), peak, counts[peak], texts[fingerprint]))
+        for total, peak, peak_count, sql in sorted(totals, key=lambda total: (-total[0], total[3]))[:args.top]:
+            print(f"{day} | {sql} | всего {total}, пик {peak_count} в {peak // 60:02d}:{peak % 60:02d}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())